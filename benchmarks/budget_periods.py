@@ -0,0 +1,55 @@
+"""
+Time BudgetCap.get_period_dates one budget at a time against the batch
+period_bounds over the same budgets. No database is needed:
+
+    python benchmarks/budget_periods.py --budgets 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expensemate.settings')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', type=int, default=100000)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from expenses.budgets import period_bounds
+    from expenses.models import BudgetCap
+
+    rng = random.Random(42)
+    today = date.today()
+    budgets = [
+        BudgetCap(
+            start_date=today - timedelta(days=rng.randrange(5 * 365)),
+            period=rng.choice(['weekly', 'monthly', 'yearly']),
+        )
+        for _ in range(args.budgets)
+    ]
+
+    started = time.perf_counter()
+    expected = [budget.get_period_dates(today) for budget in budgets]
+    per_instance = time.perf_counter() - started
+
+    started = time.perf_counter()
+    period_start, period_end = period_bounds(
+        [budget.start_date for budget in budgets], [budget.period for budget in budgets], today,
+    )
+    batch = time.perf_counter() - started
+
+    assert list(zip(period_start.tolist(), period_end.tolist())) == expected
+    print(f'get_period_dates: {per_instance * 1000:8.1f} ms for {args.budgets} budgets')
+    print(f'period_bounds:    {batch * 1000:8.1f} ms ({per_instance / batch:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Time the category classifier: training one user's model from scratch,
+suggestions from a model in memory, the incremental update a save makes
+and the batch categorization of uncategorized expenses.
+
+Seeds a throwaway SQLite database, so it never touches db.sqlite3:
+
+    python benchmarks/classifier.py --expenses 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expensemate.settings')
+
+VOCABULARY = {
+    'Food': ['lunch', 'dinner', 'coffee', 'groceries', 'bakery', 'pizza', 'market'],
+    'Transport': ['taxi', 'bus', 'train', 'fuel', 'parking', 'metro', 'toll'],
+    'Shopping': ['shoes', 'shirt', 'electronics', 'books', 'gift', 'mall', 'online'],
+    'Bills': ['electricity', 'water', 'internet', 'phone', 'rent', 'insurance', 'gas'],
+    'Health': ['pharmacy', 'doctor', 'dentist', 'gym', 'vitamins', 'clinic', 'lab'],
+}
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def describe(rng, words):
+    # Mostly words of the category, with some noise shared by all of them
+    return ' '.join([*rng.choices(words, k=2), rng.choice(['at', 'for', 'weekly', 'city', 'shop'])])
+
+
+def seed(expenses, uncategorized, batch_size=5000):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from expenses.models import Category, Expense
+
+    rng = random.Random(7)
+    today = date.today()
+    with transaction.atomic():
+        user = User.objects.create(username='classifier')
+        categories = [Category.objects.create(user=user, name=name) for name in VOCABULARY]
+        batch = []
+        for index in range(expenses + uncategorized):
+            category = rng.choice(categories)
+            batch.append(Expense(
+                user=user, category=category if index < expenses else None,
+                amount=Decimal(rng.randrange(100, 10000)) / 100,
+                date=today - timedelta(days=rng.randrange(730)),
+                description=describe(rng, VOCABULARY[category.name]),
+            ))
+            if len(batch) >= batch_size:
+                Expense.objects.bulk_create(batch)
+                batch = []
+        Expense.objects.bulk_create(batch)
+    return user, categories
+
+
+def timed(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expenses', type=int, default=50000, help='Categorized expenses of the user.')
+    parser.add_argument('--uncategorized', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'classifier.sqlite3'))
+        from django.db import transaction
+        from expenses import classifier
+        from expenses.models import Expense
+
+        user, categories = seed(args.expenses, args.uncategorized)
+        rng = random.Random(11)
+        texts = [describe(rng, words) for words in VOCABULARY.values() for _ in range(20)]
+
+        print(f'{"step":<34} {"median ms":>10} {"max ms":>10}')
+
+        def report(name, run, repeat=args.repeat):
+            median, worst = timed(run, repeat)
+            print(f'{name:<34} {median:>10.2f} {worst:>10.2f}')
+
+        report(f'train from {args.expenses} expenses', lambda: classifier.train(user.pk), repeat=3)
+        classifier.user_model(user)
+        report('suggest (model in memory)', lambda: classifier.suggest_categories(user, rng.choice(texts), 25))
+
+        expense = Expense.objects.filter(user=user, category__isnull=False).first()
+
+        def save():
+            with transaction.atomic():
+                expense.category = rng.choice(categories)
+                expense.save()
+        report('save, with the incremental update', save, repeat=50)
+        report('suggest after the update', lambda: classifier.suggest_categories(user, rng.choice(texts), 25))
+
+        started = time.perf_counter()
+        assigned, examined = classifier.categorize_uncategorized(user, 0.8)
+        elapsed = time.perf_counter() - started
+        print(f'\nCategorized {assigned} of {examined} uncategorized expenses in {elapsed * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
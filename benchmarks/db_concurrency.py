@@ -0,0 +1,142 @@
+"""
+Run N writer threads against each database profile and report write
+throughput and the share of writes that failed with a lock error.
+
+Each writer adds expenses and edits its previous one through the model
+layer, so every write also updates the rollups and budget alerts like
+expense_add and expense_edit do. Each profile runs in a fresh process
+and, for SQLite, in a throwaway database:
+
+    python benchmarks/db_concurrency.py --threads 8 --writes 200
+
+PostgreSQL is included when --postgres-url points at a scratch database;
+the benchmark migrates it and leaves its rows behind:
+
+    python benchmarks/db_concurrency.py --postgres-url postgres://localhost/expensemate_bench
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expensemate.settings')
+
+
+def profiles(directory, postgres_url=None):
+    """Return ``{name: environment}`` for every profile to run."""
+    found = {
+        'sqlite default': {
+            'DATABASE_URL': f'sqlite:///{os.path.join(directory, "default.sqlite3")}', 'SQLITE_TUNING': '0',
+        },
+        'sqlite tuned': {
+            'DATABASE_URL': f'sqlite:///{os.path.join(directory, "tuned.sqlite3")}', 'SQLITE_TUNING': '1',
+        },
+    }
+    if postgres_url:
+        found['postgres persistent'] = {'DATABASE_URL': postgres_url, 'DB_POOL': '0'}
+        found['postgres pooled'] = {'DATABASE_URL': postgres_url, 'DB_POOL': '1'}
+    return found
+
+
+def writer(user, writes, results):
+    from django.db import OperationalError, connection
+    from expenses.models import Expense
+
+    done = locked = failed = 0
+    previous = None
+    for index in range(writes):
+        try:
+            if previous is not None and index % 2:
+                previous.amount += Decimal('1')
+                previous.save()
+            else:
+                previous = Expense.objects.create(
+                    user=user, amount=Decimal('12.50'), description=f'concurrent {index}',
+                )
+            done += 1
+        except OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                locked += 1
+            else:
+                failed += 1
+    connection.close()
+    results.append((done, locked, failed))
+
+
+def run_profile(threads, writes):
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from expenses.seeding import seed_synthetic_data
+
+    call_command('migrate', verbosity=0)
+    users = seed_synthetic_data(
+        users=threads, expenses_per_user=50, years=1, categories=4, budgets=2, prefix=f'writer{os.getpid()}-',
+    )
+    connection.close()
+
+    results = []
+    workers = [threading.Thread(target=writer, args=(user, writes, results)) for user in users]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    done = sum(result[0] for result in results)
+    locked = sum(result[1] for result in results)
+    failed = sum(result[2] for result in results)
+    attempted = threads * writes
+    return {
+        'engine': connection.vendor,
+        'writes': done,
+        'seconds': round(elapsed, 2),
+        'writes_per_second': round(done / elapsed, 1),
+        'lock_errors': locked,
+        'lock_error_rate': round(locked / attempted, 4),
+        'other_errors': failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='Writes per thread.')
+    parser.add_argument('--postgres-url', help='DATABASE_URL of a scratch PostgreSQL database.')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.threads, args.writes)))
+        return
+
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, env in profiles(directory, args.postgres_url).items():
+            completed = subprocess.run(
+                [sys.executable, __file__, '--child', '--threads', str(args.threads), '--writes', str(args.writes)],
+                env={**os.environ, **env}, capture_output=True, text=True,
+            )
+            if completed.returncode:
+                print(f'{name}: failed\n{completed.stderr}', file=sys.stderr)
+                continue
+            report[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    print(f'{"profile":<20} {"writes/s":>10} {"lock errors":>12} {"error rate":>11}')
+    for name, result in report.items():
+        print(f'{name:<20} {result["writes_per_second"]:>10} {result["lock_errors"]:>12} '
+              f'{result["lock_error_rate"]:>10.1%}')
+
+
+if __name__ == '__main__':
+    main()
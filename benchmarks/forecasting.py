@@ -0,0 +1,50 @@
+"""
+Time the local forecasting engine per user and in one batch for all users.
+
+Seeds a throwaway SQLite database, so it never touches db.sqlite3:
+
+    python benchmarks/forecasting.py --users 50 --expenses 5000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from query_plans import seed, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--expenses', type=int, default=5000, help='expenses per user')
+    parser.add_argument('--categories', type=int, default=8, help='categories per user')
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'bench.sqlite3'))
+        seed(args.users, args.expenses, args.categories, args.years)
+
+        from django.contrib.auth.models import User
+        from expenses.forecasting import forecast_user, forecast_users
+
+        users = list(User.objects.all())
+        timings = []
+        for user in users:
+            started = time.perf_counter()
+            forecast_user(user)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        forecasts = forecast_users(users)
+        batch = (time.perf_counter() - started) * 1000
+
+        series = sum(len(forecast.categories) for forecast in forecasts.values())
+        print(f'per user:  median {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms')
+        print(f'batch:     {batch:.2f} ms for {len(users)} users, {series} series '
+              f'({batch / len(users):.2f} ms per user)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Compare query plans and timings of the expense access paths with and
+without the composite indexes on Expense.
+
+Seeds a throwaway SQLite database, so it never touches db.sqlite3:
+
+    python benchmarks/query_plans.py --users 20 --expenses 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expensemate.settings')
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(users, expenses_per_user, categories_per_user, years, budgets_per_user=4):
+    from expenses.seeding import seed_synthetic_data
+
+    owners = seed_synthetic_data(
+        users=users, expenses_per_user=expenses_per_user, years=years,
+        categories=categories_per_user, budgets=budgets_per_user, prefix='bench',
+    )
+    return owners[0]
+
+
+def benchmark_queries(user):
+    from django.db.models import Sum
+    from expenses.models import Category, Expense, SpendingRollup
+    from expenses.pagination import keyset_page
+
+    today = date.today()
+    month_start = today.replace(day=1)
+    category = Category.objects.filter(user=user).first()
+    expenses = Expense.objects.filter(user=user)
+    first_page, cursor = keyset_page(expenses, page_size=50)
+
+    return {
+        'list first page': lambda: expenses.order_by('-date', '-created_at', '-id')[:51],
+        'list next page': lambda: keyset_page(expenses, cursor=cursor, page_size=50)[0],
+        'list filtered total': lambda: expenses.filter(
+            category=category, date__gte=today - timedelta(days=90),
+        ).aggregate(Sum('amount')),
+        'budget window (expenses)': lambda: expenses.filter(
+            category=category, date__gte=month_start, date__lte=today,
+        ).aggregate(Sum('amount')),
+        'dashboard month (expenses)': lambda: expenses.filter(date__gte=month_start).aggregate(Sum('amount')),
+        'dashboard month (rollups)': lambda: SpendingRollup.objects.filter(
+            user=user, granularity=SpendingRollup.DAY, period__gte=month_start,
+        ).aggregate(Sum('total')),
+    }
+
+
+def run(queries, repeat):
+    results = {}
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = query()
+            if not isinstance(result, (dict, list)):
+                list(result)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def plans(queries):
+    from django.db import connection
+
+    output = {}
+    for name, query in queries.items():
+        with connection.execute_wrapper(_capture_sql(output, name)):
+            result = query()
+            if not isinstance(result, (dict, list)):
+                list(result)
+    return output
+
+
+def _capture_sql(output, name):
+    def wrapper(execute, sql, params, many, context):
+        from django.db import connection
+
+        if name not in output:
+            # Record the name first: the EXPLAIN itself passes through this wrapper
+            output[name] = []
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                output[name] = [row[-1] for row in cursor.fetchall()]
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def toggle_indexes(enabled):
+    from django.db import connection
+    from expenses.models import Expense
+
+    with connection.schema_editor() as editor:
+        for index in Expense._meta.indexes:
+            if enabled:
+                editor.add_index(Expense, index)
+            else:
+                editor.remove_index(Expense, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--expenses', type=int, default=20000, help='Expenses per user.')
+    parser.add_argument('--categories', type=int, default=8, help='Categories per user.')
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'bench.sqlite3'))
+        user = seed(args.users, args.expenses, args.categories, args.years)
+        queries = benchmark_queries(user)
+
+        toggle_indexes(False)
+        before = run(queries, args.repeat), plans(queries)
+        toggle_indexes(True)
+        after = run(queries, args.repeat), plans(queries)
+
+    for name in queries:
+        print(f'== {name}')
+        print(f'   without indexes: {before[0][name]:8.2f} ms  {" | ".join(before[1].get(name, []))}')
+        print(f'   with indexes:    {after[0][name]:8.2f} ms  {" | ".join(after[1].get(name, []))}')
+
+
+if __name__ == '__main__':
+    main()
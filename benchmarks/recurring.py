@@ -0,0 +1,109 @@
+"""
+Time the recurring expense scheduler catching up on a long backlog,
+against saving the same occurrences one Expense.save() at a time.
+
+Seeds a throwaway SQLite database, so it never touches db.sqlite3:
+
+    python benchmarks/recurring.py --users 200 --months 6
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expensemate.settings')
+
+FREQUENCIES = ['daily', 'weekly', 'weekly', 'monthly', 'monthly', 'monthly', 'yearly']
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(prefix, users, rules_per_user, start):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from expenses.models import BudgetCap, Category, RecurringExpense
+
+    rng = random.Random(3)
+    with transaction.atomic():
+        owners = User.objects.bulk_create([User(username=f'{prefix}{index}') for index in range(users)])
+        rules = []
+        for owner in owners:
+            category = Category.objects.create(user=owner, name='Bills')
+            BudgetCap.objects.create(user=owner, name='Bills', amount=Decimal('500'), category=category,
+                                     start_date=start)
+            for index in range(rules_per_user):
+                rules.append(RecurringExpense(
+                    user=owner, category=category, amount=Decimal(rng.randrange(100, 5000)) / 100,
+                    description=f'Bill {index}', frequency=rng.choice(FREQUENCIES),
+                    start_date=start + timedelta(days=rng.randrange(28)),
+                ))
+        for rule in rules:
+            rule.next_date = rule.start_date
+        RecurringExpense.objects.bulk_create(rules)
+    return rules
+
+
+def one_at_a_time(rules, today):
+    # What the scheduler replaces: one save, with its rollup, cache and alert work, per occurrence
+    from expenses.models import Expense
+    from expenses.recurring import occurrences
+
+    created = 0
+    for rule in rules:
+        for day in occurrences(rule, rule.next_date, today).tolist():
+            Expense(user_id=rule.user_id, category_id=rule.category_id, amount=rule.amount,
+                    description=rule.description, date=day).save()
+            created += 1
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rules', type=int, default=5, help='Recurring expenses per user.')
+    parser.add_argument('--months', type=int, default=6, help='Length of the backlog.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'recurring.sqlite3'))
+        from django.utils import timezone
+        from expenses.recurring import materialize_recurring
+
+        today = timezone.localdate()
+        start = today - timedelta(days=30 * args.months)
+        seed('bulk', args.users, args.rules, start)
+        started = time.perf_counter()
+        created, due = materialize_recurring(today)
+        elapsed = time.perf_counter() - started
+        print(f'scheduler:       {created} expenses from {due} rules in {elapsed:.2f} s '
+              f'({created / elapsed:.0f} expenses/s)')
+
+        started = time.perf_counter()
+        again, _ = materialize_recurring(today)
+        print(f'rerun:           {again} expenses in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+        # The baseline is slow enough that a tenth of the users shows the rate
+        rules = seed('single', max(1, args.users // 10), args.rules, start)
+        started = time.perf_counter()
+        created = one_at_a_time(rules, today)
+        elapsed = time.perf_counter() - started
+        print(f'one at a time:   {created} expenses in {elapsed:.2f} s ({created / elapsed:.0f} expenses/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Time description searches through the full-text index against the
+icontains scans they replace, for one user's expense list and for the
+admin's search over everybody's expenses.
+
+Seeds a throwaway SQLite database, so it never touches db.sqlite3:
+
+    python benchmarks/search.py --users 100 --expenses 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expensemate.settings')
+
+COMMON_WORDS = ['lunch', 'coffee', 'groceries', 'taxi', 'rent', 'dinner', 'fuel', 'movie', 'pharmacy', 'gift']
+
+
+def setup_django(db_path):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(users, expenses_per_user, batch_size=5000):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from expenses.models import Expense
+
+    rng = random.Random(42)
+    # A long tail of rare words next to a few that appear everywhere
+    rare_words = [f'{word}{index}' for index in range(2000) for word in ('shop', 'cafe', 'ref')]
+    today = date.today()
+    with transaction.atomic():
+        owners = User.objects.bulk_create([User(username=f'search{index}') for index in range(users)])
+        for owner in owners:
+            batch = []
+            for _ in range(expenses_per_user):
+                words = [rng.choice(COMMON_WORDS), *rng.choices(rare_words, k=3)]
+                batch.append(Expense(
+                    user=owner, amount=Decimal(rng.randrange(100, 10000)) / 100,
+                    date=today - timedelta(days=rng.randrange(730)), description=' '.join(words),
+                ))
+                if len(batch) >= batch_size:
+                    Expense.objects.bulk_create(batch)
+                    batch = []
+            Expense.objects.bulk_create(batch)
+    return owners[len(owners) // 2]
+
+
+def timed(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--expenses', type=int, default=10000, help='Expenses per user.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'search.sqlite3'))
+        from expenses.filters import filter_expenses
+        from expenses.models import Expense
+        from expenses.pagination import KEYSET_ORDERING, keyset_page
+        from expenses.search import SEARCH_ORDERING, search_expenses
+
+        started = time.perf_counter()
+        user = seed(args.users, args.expenses)
+        print(f'Seeded {args.users * args.expenses} expenses in {time.perf_counter() - started:.1f} s\n')
+
+        mine = Expense.objects.filter(user=user)
+        cases = {}
+        for label, word in (('common word', 'lunch'), ('rare word', 'cafe1234')):
+            cases[f'user list, {label}'] = (
+                lambda word=word: keyset_page(filter_expenses(mine, {'q': word}, user), ordering=SEARCH_ORDERING),
+                lambda word=word: keyset_page(mine.filter(description__icontains=word), ordering=KEYSET_ORDERING),
+            )
+            cases[f'admin count, {label}'] = (
+                lambda word=word: search_expenses(Expense.objects.all(), word).count(),
+                lambda word=word: Expense.objects.filter(description__icontains=word).count(),
+            )
+
+        print(f'{"case":<26} {"full-text ms":>13} {"icontains ms":>13}')
+        for name, (indexed, scan) in cases.items():
+            print(f'{name:<26} {timed(indexed, args.repeat):>13.1f} {timed(scan, args.repeat):>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Drive the main expense views through the Django test client and report
+p50/p95 latency, query count and peak memory per view as JSON.
+
+Seeds a throwaway SQLite database, so it never touches db.sqlite3. Save a
+run and compare a later one against it:
+
+    python benchmarks/view_timings.py --expenses 20000 --output before.json
+    python benchmarks/view_timings.py --expenses 20000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from query_plans import setup_django
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenarios(client, user):
+    from django.urls import reverse
+    from expenses.models import Category
+    from expenses.reports import build_report_pdf
+
+    category = Category.objects.filter(user=user).first()
+    today = datetime.now().date().isoformat()
+
+    def get(name):
+        def request():
+            response = client.get(reverse(name))
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response.status_code
+        return request
+
+    def add_expense():
+        return client.post(reverse('expense_add'), {
+            'amount': '125.50', 'date': today, 'description': 'benchmark', 'category': category.pk,
+        }).status_code
+
+    def render_pdf():
+        build_report_pdf(user, {})
+        return None
+
+    return {
+        'dashboard': get('dashboard'),
+        'expense_list': get('expense_list'),
+        'budget_list': get('budget_list'),
+        'export_csv': get('export_csv'),
+        'export_pdf': get('export_pdf'),
+        'export_pdf (render)': render_pdf,
+        'expense_add': add_expense,
+    }
+
+
+def measure(scenario, repeat, warmup):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from expenses.profiling import capture_profiles
+
+    for _ in range(warmup):
+        scenario()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        status = scenario()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Counting queries and tracing allocations slow requests down, so they
+    # get passes of their own. The query log is reset when a request starts,
+    # so requests are counted by the profiling middleware instead.
+    with capture_profiles() as profiles, CaptureQueriesContext(connection) as queries:
+        scenario()
+    query_count = sum(profile.queries for profile in profiles) if profiles else len(queries)
+    tracemalloc.start()
+    scenario()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p95 = statistics.quantiles(timings, n=20, method='inclusive')[18] if repeat > 1 else timings[0]
+    return {
+        'status': status,
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(p95, 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'queries': query_count,
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(current, baseline):
+    lines = [f'{"view":<20} {"p50 ms":>26} {"p95 ms":>26} {"queries":>12} {"peak KiB":>28}']
+    for name, result in current['views'].items():
+        before = baseline['views'].get(name)
+        if before is None:
+            continue
+
+        def cell(key):
+            change = f'{(result[key] - before[key]) / before[key] * 100:+.0f}%' if before[key] else ''
+            return f'{before[key]:>9} → {result[key]:<9} {change:>5}'
+
+        lines.append(
+            f'{name:<20} {cell("p50_ms"):>26} {cell("p95_ms"):>26} '
+            f'{before["queries"]:>5} → {result["queries"]:<4} {cell("peak_memory_kib"):>28}'
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--expenses', type=int, default=5000, help='Expenses per user.')
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--categories', type=int, default=8, help='Categories per user.')
+    parser.add_argument('--budgets', type=int, default=6, help='Budgets per user.')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+    parser.add_argument('--compare', help='A previous JSON report to print a comparison against.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'bench.sqlite3'))
+
+        import django
+        from django.conf import settings
+        from django.test import Client
+        from expenses.seeding import seed_synthetic_data
+
+        settings.DEBUG = False
+        settings.MEDIA_ROOT = os.path.join(directory, 'media')
+        user = seed_synthetic_data(
+            users=args.users, expenses_per_user=args.expenses, years=args.years,
+            categories=args.categories, budgets=args.budgets, prefix='bench',
+        )[0]
+        client = Client()
+        client.force_login(user)
+
+        report = {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'views': {
+                name: measure(scenario, args.repeat, args.warmup)
+                for name, scenario in scenarios(client, user).items()
+            },
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            print(compare(report, json.load(handle)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
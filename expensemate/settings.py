@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_config, replica_config, sqlite_pragmas
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,11 +44,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'expenses.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'expenses.routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,7 +59,7 @@ ROOT_URLCONF = 'expensemate.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'expenses.profiling.ProfilingTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -62,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'expenses.alerts.budget_alerts',
             ],
         },
     },
@@ -72,13 +78,23 @@ WSGI_APPLICATION = 'expensemate.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Configured from DATABASE_URL and related variables, see database.py
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ, BASE_DIR),
 }
+replica = replica_config(os.environ, BASE_DIR)
+if replica:
+    DATABASES['replica'] = replica
+
+# Views marked with replica_reads read from DATABASE_REPLICA; a session
+# that wrote reads from the primary for the next REPLICA_PIN_SECONDS
+DATABASE_ROUTERS = ['expenses.routing.ReplicaRouter']
+DATABASE_REPLICA = 'replica' if 'replica' in DATABASES else None
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '15'))
+
+# Applied to every new SQLite connection by expenses.signals
+SQLITE_PRAGMAS = sqlite_pragmas(os.environ)
 
 
 # Password validation
@@ -118,11 +134,81 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Generated report artifacts
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+EXPENSE_PAGE_SIZE = 50
+EXPENSE_MAX_PAGE_SIZE = 200
+EXPORT_CHUNK_SIZE = 2000
+REPORT_CHUNK_ROWS = 500
+# Workers refresh a running job's heartbeat every REPORT_HEARTBEAT_INTERVAL
+# seconds; a job silent for REPORT_JOB_TIMEOUT seconds is requeued, and
+# failed after REPORT_MAX_ATTEMPTS claims
+REPORT_HEARTBEAT_INTERVAL = 30
+REPORT_JOB_TIMEOUT = 600
+REPORT_MAX_ATTEMPTS = 3
+# Operations accepted by one /api/v1/<resource>/batch/ request
+API_MAX_BATCH_SIZE = 500
+# Currency of amounts without a rate conversion: spending rollups, the
+# dashboard and budget totals. Changing it needs `manage.py rebuild_rollups`.
+BASE_CURRENCY = os.environ.get('BASE_CURRENCY', 'INR')
+# (currency, date) rates each process keeps in memory
+EXCHANGE_RATE_CACHE_SIZE = 4096
+# Users whose category classifier each process keeps in memory
+CLASSIFIER_CACHE_USERS = int(os.environ.get('CLASSIFIER_CACHE_USERS', '200'))
+
+# AI predictions: 'gemini', or 'stub' for the offline backend
+AI_BACKEND = os.environ.get('AI_BACKEND', 'gemini')
+AI_STUB_DELAY = float(os.environ.get('AI_STUB_DELAY', '0'))
+AI_CACHE_TIMEOUT = 60 * 60
+AI_STUB_TOKEN_DELAY = float(os.environ.get('AI_STUB_TOKEN_DELAY', '0'))
+# Streaming answers must finish within AI_TIMEOUT seconds; at most
+# AI_MAX_CONCURRENT_CALLS model calls run per process, and a request waits
+# up to AI_QUEUE_TIMEOUT seconds for a free slot.
+AI_TIMEOUT = 30
+AI_MAX_CONCURRENT_CALLS = 4
+AI_QUEUE_TIMEOUT = 5
+
+# Request profiling: per-view timings and query counts are logged to
+# expenses.profiling and served at /metrics/ to staff users. Views running
+# more queries than their budget are logged as warnings.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+# Query ceilings per URL name; page views include the session and user
+# lookups, the check for unseen budget alerts and, for conditional views
+# and budget history, the data version lookup
+VIEW_QUERY_BUDGETS = {
+    'dashboard': 8,
+    'expense_list': 7,
+    'expense_list_page': 4,
+    'expense_add': 17,
+    'expense_edit': 17,
+    'budget_list': 6,
+    'budget_history': 6,
+    'category_list': 4,
+    'export_csv': 3,
+    'export_pdf': 9,
+    'ai_predictions': 3,
+    'api_expenses': 19,
+    'api_analytics': 6,
+    'api_category_suggest': 4,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'expenses.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
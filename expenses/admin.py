@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Expense, BudgetCap, Category
+from .models import Expense, BudgetCap, Category, ExchangeRate, RecurringExpense
+from .recurring import reschedule
+from .search import search_expenses
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,13 +12,36 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
-    list_display = ('date', 'user', 'category', 'amount', 'description')
+    list_display = ('date', 'user', 'category', 'amount', 'currency', 'description')
     list_filter = ('category', 'date', 'user')
     search_fields = ('description',)
     date_hierarchy = 'date'
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index instead of an icontains scan
+        if not search_term.strip():
+            return queryset, False
+        return search_expenses(queryset, search_term), False
 
 @admin.register(BudgetCap)
 class BudgetCapAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'amount', 'period', 'category', 'is_active')
+    list_display = ('name', 'user', 'amount', 'currency', 'period', 'category', 'is_active')
     list_filter = ('period', 'category', 'is_active', 'user')
     search_fields = ('name',)
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ('description', 'user', 'amount', 'currency', 'frequency', 'next_date', 'is_active')
+    list_filter = ('frequency', 'is_active')
+    search_fields = ('description',)
+    readonly_fields = ('next_date',)
+    
+    def save_model(self, request, obj, form, change):
+        reschedule(obj)
+        super().save_model(request, obj, form, change)
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'date', 'rate')
+    list_filter = ('currency',)
+    date_hierarchy = 'date'
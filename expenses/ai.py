@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+
+import google.generativeai as genai
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .currency import format_money
+from .forecasting import forecast_user, format_forecast
+from .metrics import month_start
+from .models import SpendingRollup
+from .versioning import get_data_version
+
+
+SYSTEM_PROMPT = "No Markdown syntax allowed."
+
+DIGEST_MONTHS = 12
+TREND_WINDOW = 3
+
+PROMPTS = {
+    'next_month': (
+        "Based on these expense records, predict next month's spending:",
+        "Provide a brief prediction of next month's spending with specific amounts.",
+    ),
+    'category_insights': (
+        "Analyze these expenses and provide category-wise insights:",
+        "Which categories need attention? Provide specific recommendations.",
+    ),
+    'budget_advice': (
+        "Based on these expenses, provide budget recommendations:",
+        "Suggest a realistic monthly budget and saving strategies.",
+    ),
+}
+
+# Answered by the built-in forecasting engine without calling a model
+LOCAL_FORECAST = 'forecast'
+
+
+class AIConfigurationError(Exception):
+    pass
+
+
+class AIBusyError(Exception):
+    pass
+
+
+class CallLimiter:
+    """
+    Caps the model calls outstanding in this process at AI_MAX_CONCURRENT_CALLS.
+
+    Backed by a plain lock and counter rather than an asyncio.Semaphore so
+    one limit covers sync views in worker threads and async views on any
+    event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def try_acquire(self):
+        capacity = getattr(settings, 'AI_MAX_CONCURRENT_CALLS', 4)
+        with self._lock:
+            if self.active < capacity:
+                self.active += 1
+                return True
+            return False
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def _deadline(self):
+        return time.monotonic() + getattr(settings, 'AI_QUEUE_TIMEOUT', 5)
+
+    @contextmanager
+    def slot(self):
+        deadline = self._deadline()
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                raise AIBusyError("Too many AI requests are in progress. Please try again shortly.")
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        deadline = self._deadline()
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                raise AIBusyError("Too many AI requests are in progress. Please try again shortly.")
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+limiter = CallLimiter()
+
+
+class GeminiBackend:
+    model_name = 'gemini-2.5-flash'
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
+        if not self.api_key:
+            raise AIConfigurationError(
+                "Please set your GEMINI_API_KEY environment variable to use AI predictions."
+            )
+
+    def generate(self, prompt):
+        genai.configure(api_key=self.api_key)
+        model = genai.GenerativeModel(self.model_name)
+        return model.generate_content(prompt).text
+
+    async def stream(self, prompt):
+        genai.configure(api_key=self.api_key)
+        model = genai.GenerativeModel(self.model_name)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubBackend:
+    """
+    Offline stand-in for the model that answers from the digest.
+
+    ``generate`` sleeps ``delay`` seconds before answering; ``stream`` emits
+    the answer word by word with ``token_delay`` seconds before each word.
+    """
+
+    def __init__(self, delay=0.0, token_delay=0.0):
+        self.delay = delay
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def answer(self, prompt):
+        facts = [line for line in prompt.splitlines() if line.startswith(('Total', 'Trend', 'Average', 'Forecast'))]
+        return 'Offline estimate based on your spending summary.\n' + '\n'.join(facts)
+
+    def generate(self, prompt):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.answer(prompt)
+
+    async def stream(self, prompt):
+        self.calls += 1
+        for token in re.findall(r'\S+\s*', self.answer(prompt)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+
+def get_backend():
+    name = getattr(settings, 'AI_BACKEND', 'gemini')
+    if name == 'stub':
+        return StubBackend(
+            delay=getattr(settings, 'AI_STUB_DELAY', 0.0),
+            token_delay=getattr(settings, 'AI_STUB_TOKEN_DELAY', 0.0),
+        )
+    return GeminiBackend()
+
+
+def _percent_change(current, previous):
+    if not previous:
+        return None
+    return int(((current - previous) / previous) * 100)
+
+
+def build_expense_digest(user, today=None):
+    """
+    Summarize a user's spending for a prompt from the monthly rollups.
+
+    Costs one query however many expenses the user has, and produces a
+    prompt of bounded size: monthly totals, category shares and a trend.
+    """
+    if today is None:
+        today = timezone.now().date()
+    window_start = month_start(today, DIGEST_MONTHS - 1)
+    rows = SpendingRollup.objects.filter(
+        user=user, granularity=SpendingRollup.MONTH,
+    ).values_list('category__name', 'period', 'total')
+
+    total = Decimal('0')
+    categories = {}
+    monthly = {month_start(today, back): Decimal('0.00') for back in range(DIGEST_MONTHS - 1, -1, -1)}
+    first_month = None
+    for category_name, period, amount in rows:
+        total += amount
+        name = category_name or 'Uncategorized'
+        categories[name] = categories.get(name, Decimal('0')) + amount
+        if period >= window_start:
+            monthly[period] = monthly.get(period, Decimal('0')) + amount
+        first_month = period if first_month is None else min(first_month, period)
+
+    history_months = 0
+    if first_month is not None:
+        history_months = (today.year - first_month.year) * 12 + today.month - first_month.month + 1
+
+    lines = [f"Total expenses so far: {format_money(total)} over {history_months} months of history"]
+    if history_months:
+        lines.append(f"Average per month: {format_money(round(total / history_months, 2))}")
+
+    shares = sorted(categories.items(), key=lambda item: item[1], reverse=True)
+    lines.append('Category breakdown: ' + ', '.join(
+        f"{name}: {format_money(amount)} ({int(amount / total * 100) if total else 0}%)" for name, amount in shares
+    ))
+
+    months = sorted(monthly)
+    lines.append(f"Monthly totals (last {DIGEST_MONTHS} months): " + ', '.join(
+        f"{month.strftime('%b %Y')}: {format_money(monthly[month])}" for month in months
+    ))
+
+    # Full months only: the current month is still in progress
+    closed = [monthly[month] for month in months[:-1]]
+    recent = sum(closed[-TREND_WINDOW:], Decimal('0')) / TREND_WINDOW
+    earlier = sum(closed[-2 * TREND_WINDOW:-TREND_WINDOW], Decimal('0')) / TREND_WINDOW
+    change = _percent_change(recent, earlier)
+    trend = (
+        f"Trend: last {TREND_WINDOW} full months averaged {format_money(round(recent, 2))} "
+        f"vs {format_money(round(earlier, 2))} before"
+    )
+    lines.append(trend + (f" ({change:+d}%)" if change is not None else ""))
+    lines.append(f"Spent so far this month: {format_money(monthly[months[-1]])} ({today.day} days in)")
+    return '\n'.join(lines)
+
+
+def build_context(user, prediction_type):
+    """Return the digest, with the local forecast added for next-month predictions."""
+    digest = build_expense_digest(user)
+    if prediction_type == 'next_month':
+        digest += '\n' + format_forecast(forecast_user(user))
+    return digest
+
+
+def local_forecast_answer(user):
+    return 'Built-in statistical forecast of your spending.\n' + format_forecast(forecast_user(user))
+
+
+def build_prompt(prediction_type, question, digest):
+    if prediction_type in PROMPTS:
+        intro, ask = PROMPTS[prediction_type]
+        return f"{intro}\n\n{digest}\n\n{ask}"
+    return f"Based on these expense records, answer this question: {question}\n\n{digest}"
+
+
+def normalize_question(question):
+    return re.sub(r'\s+', ' ', question or '').strip().rstrip('?!. ').lower()
+
+
+def response_cache_key(user, prediction_type, question):
+    version = get_data_version(user).version
+    if prediction_type in PROMPTS:
+        question = ''
+    else:
+        prediction_type = 'custom'
+    raw = f"{user.pk}:{version}:{prediction_type}:{normalize_question(question)}"
+    return 'expenses:ai-response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def generate_prediction(user, prediction_type, question='', backend=None):
+    """Return the model's answer, reusing a cached answer while the user's data is unchanged."""
+    if prediction_type == LOCAL_FORECAST:
+        return local_forecast_answer(user)
+    key = response_cache_key(user, prediction_type, question)
+    answer = cache.get(key)
+    if answer is None:
+        if backend is None:
+            backend = get_backend()
+        prompt = build_prompt(prediction_type, question, build_context(user, prediction_type))
+        with limiter.slot():
+            answer = backend.generate(prompt + SYSTEM_PROMPT)
+        cache.set(key, answer, getattr(settings, 'AI_CACHE_TIMEOUT', 60 * 60))
+    return answer
+
+
+async def _with_deadline(tokens, timeout):
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            try:
+                yield await asyncio.wait_for(anext(tokens), remaining)
+            except StopAsyncIteration:
+                return
+    finally:
+        await tokens.aclose()
+
+
+async def stream_prediction(user, prediction_type, question='', backend=None):
+    """
+    Yield the model's answer as it is generated.
+
+    ORM work runs through sync_to_async, the call waits for a limiter slot
+    and the whole generation must finish within AI_TIMEOUT seconds, or
+    TimeoutError is raised. Completed answers go into the same cache as
+    ``generate_prediction``.
+    """
+    if prediction_type == LOCAL_FORECAST:
+        yield await sync_to_async(local_forecast_answer)(user)
+        return
+
+    key = await sync_to_async(response_cache_key)(user, prediction_type, question)
+    answer = await cache.aget(key)
+    if answer is not None:
+        yield answer
+        return
+
+    if backend is None:
+        backend = get_backend()
+    digest = await sync_to_async(build_context)(user, prediction_type)
+    prompt = build_prompt(prediction_type, question, digest) + SYSTEM_PROMPT
+
+    parts = []
+    async with limiter.async_slot():
+        async for token in _with_deadline(backend.stream(prompt), getattr(settings, 'AI_TIMEOUT', 30)):
+            parts.append(token)
+            yield token
+    await cache.aset(key, ''.join(parts), getattr(settings, 'AI_CACHE_TIMEOUT', 60 * 60))
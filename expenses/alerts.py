@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .budgets import budget_periods, evaluate_budgets
+from .models import BudgetAlert, BudgetCap, Expense
+from .versioning import bump_alerts_version
+
+
+_date_field = Expense._meta.get_field('date')
+
+
+def alert_level(status):
+    if status.exceeded:
+        return BudgetAlert.EXCEEDED
+    if status.is_warning:
+        return BudgetAlert.WARNING
+    return None
+
+
+def budgets_covering(user, expenses, today=None):
+    """
+    Return the active budgets whose current period covers any of ``expenses``.
+
+    Overall budgets cover every category; the others only their own.
+    """
+    if today is None:
+        today = timezone.now().date()
+    expenses = [expense for expense in expenses if expense is not None]
+    if not expenses:
+        return []
+    # Unsaved defaults can still be datetimes from timezone.now
+    days = [_date_field.to_python(expense.date) for expense in expenses]
+    categories = {expense.category_id for expense in expenses}
+    budgets = list(BudgetCap.objects.filter(user=user, is_active=True).filter(
+        Q(category__isnull=True) | Q(category_id__in=categories - {None})
+    ).select_related('category'))
+
+    covering = []
+    for budget, (period_start, period_end) in zip(budgets, budget_periods(budgets, today)):
+        if any(
+            (budget.category_id is None or budget.category_id == expense.category_id)
+            and period_start <= day <= period_end
+            for expense, day in zip(expenses, days)
+        ):
+            covering.append(budget)
+    return covering
+
+
+def record_transitions(statuses):
+    """
+    Persist the threshold crossings in ``statuses`` as BudgetAlert rows.
+
+    Each level is recorded once per budget period. Unseen alerts that no
+    longer apply, because spending fell back or a warning was overtaken by
+    an exceeded alert, are withdrawn. Returns the new alerts.
+    """
+    statuses = list(statuses)
+    if not statuses:
+        return []
+    existing = {}
+    for alert in BudgetAlert.objects.filter(
+        budget__in=[status.budget for status in statuses],
+        period_start__in={status.period_start for status in statuses},
+    ):
+        existing[(alert.budget_id, alert.period_start, alert.level)] = alert
+
+    created = []
+    withdrawn = []
+    for status in statuses:
+        level = alert_level(status)
+        if level is not None and (status.budget.pk, status.period_start, level) not in existing:
+            created.append(BudgetAlert(
+                user_id=status.budget.user_id, budget=status.budget, level=level,
+                period_start=status.period_start, period_end=status.period_end,
+                spent=status.spent, percent=status.percent,
+            ))
+        for other in (BudgetAlert.WARNING, BudgetAlert.EXCEEDED):
+            alert = existing.get((status.budget.pk, status.period_start, other))
+            if other != level and alert is not None and alert.seen_at is None:
+                withdrawn.append(alert.pk)
+
+    with transaction.atomic():
+        if withdrawn:
+            BudgetAlert.objects.filter(pk__in=withdrawn).delete()
+        BudgetAlert.objects.bulk_create(created, ignore_conflicts=True)
+    return created
+
+
+def refresh_budget_alerts(user, expenses=None, budgets=None, today=None):
+    """
+    Re-check the budgets touched by a write and record threshold crossings.
+
+    With ``expenses``, only the budgets covering them are evaluated, so the
+    cost follows the number of affected budgets rather than all of them.
+    """
+    if expenses is not None:
+        budgets = budgets_covering(user, expenses, today)
+        if not budgets:
+            return []
+    return record_transitions(evaluate_budgets(user, budgets, today))
+
+
+def pop_budget_alerts(user):
+    """Return the user's unseen alerts and mark them as seen."""
+    alerts = list(
+        BudgetAlert.objects.filter(user=user, seen_at__isnull=True)
+        .select_related('budget').order_by('created_at', 'pk')
+    )
+    if alerts:
+        BudgetAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(seen_at=timezone.now())
+        # Cached pages must not show them again, but nothing keyed by the data version changed
+        bump_alerts_version(user.pk)
+    return alerts
+
+
+def budget_alerts(request):
+    """Context processor exposing unseen budget alerts to the page being rendered."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'budget_alerts': []}
+    # Only queried when a template shows the alerts, so JSON views pay nothing
+    return {'budget_alerts': SimpleLazyObject(lambda: pop_budget_alerts(user))}
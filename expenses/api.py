@@ -0,0 +1,443 @@
+import json
+from copy import copy
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .budgets import evaluate_budgets
+from .categories import category_names
+from .classifier import suggest_categories
+from .filters import clean_filters, filter_expenses
+from .forms import BudgetCapForm, CategoryForm, ExpenseBatchForm, ExpenseForm
+from .metrics import get_dashboard_metrics
+from .models import BudgetCap, Category, Expense
+from .pagination import KEYSET_ORDERING, keyset_page
+from .routing import reading_from_replica, replica_reads
+from .search import SEARCH_ORDERING
+from .versioning import conditional_on_data_version, request_data_version
+from .writes import save_expenses
+
+
+class APIError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **extra}
+
+
+def api_view(*methods):
+    """
+    Turn ``view`` into a JSON endpoint for ``methods``.
+
+    Anonymous requests get 401 instead of a login redirect and an APIError
+    raised by the view becomes its JSON error response. Writes go through
+    CSRF protection like the HTML forms, so clients send the csrftoken
+    cookie back in the X-CSRFToken header.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'Authentication required.'}, status=401)
+            if request.method not in methods:
+                response = JsonResponse({'error': f'{request.method} is not allowed here.'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except APIError as e:
+                return JsonResponse(e.body, status=e.status)
+        return wrapper
+    return decorator
+
+
+def read_json(request):
+    try:
+        return json.loads(request.body or b'null')
+    except (ValueError, UnicodeDecodeError):
+        raise APIError(400, 'The request body is not valid JSON.')
+
+
+class Resource:
+    """How the API lists, serializes and writes one model owned by a user."""
+    model = None
+    form_class = None
+    # Output name -> lookup passed to .values()
+    fields = {}
+    ordering = ('id',)
+
+    @property
+    def writable(self):
+        return self.form_class._meta.fields
+
+    def queryset(self, user, params=None):
+        return self.model.objects.filter(user=user)
+
+    def list_ordering(self, params):
+        return self.ordering
+
+    def select(self, params):
+        """Return the ``(name, lookup)`` pairs of the fields asked for in ``params['fields']``."""
+        requested = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+        if not requested:
+            return list(self.fields.items())
+        unknown = [name for name in requested if name not in self.fields]
+        if unknown:
+            raise APIError(400, f'Unknown fields: {", ".join(unknown)}.')
+        return [(name, self.fields[name]) for name in dict.fromkeys(requested)]
+
+    def values(self, queryset, selected, ordering=None):
+        # The ordering key is always read so the cursor can be built from the row
+        ordering = ordering or self.ordering
+        lookups = ['id', *(lookup for _, lookup in selected), *(name.lstrip('-') for name in ordering)]
+        return queryset.values(*dict.fromkeys(lookups))
+
+    def serialize(self, rows, selected):
+        return [{name: row[lookup] for name, lookup in selected} for row in rows]
+
+    def defaults(self):
+        """Model defaults for writable fields a create leaves out, as the HTML forms prefill them."""
+        found = {}
+        for name in self.writable:
+            field = self.model._meta.get_field(name)
+            if field.has_default():
+                found[name] = field.get_default()
+        return found
+
+    def current(self, instance):
+        return {name: getattr(instance, self.model._meta.get_field(name).attname) for name in self.writable}
+
+    def batch_context(self, user, operations):
+        """Keyword arguments of form() shared by the ``operations`` of one batch, each read once."""
+        return {}
+
+    def form(self, user, data, instance=None):
+        return self.form_class(data, instance=instance, user=user)
+
+    def save(self, user, created, updated, deleted):
+        """
+        Write the validated ``created`` forms, the ``(original, form)`` pairs
+        of ``updated`` and delete the ``deleted`` instances. Returns the
+        saved instances.
+        """
+        saved = []
+        for form in created:
+            instance = form.save(commit=False)
+            instance.user = user
+            instance.save()
+            saved.append(instance)
+        for _, form in updated:
+            saved.append(form.save())
+        for instance in deleted:
+            instance.delete()
+        return saved
+
+
+class ExpenseResource(Resource):
+    model = Expense
+    form_class = ExpenseForm
+    fields = {
+        'id': 'id',
+        'date': 'date',
+        'amount': 'amount',
+        'currency': 'currency',
+        'description': 'description',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'recurring': 'recurring_id',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    ordering = KEYSET_ORDERING
+
+    def queryset(self, user, params=None):
+        expenses = super().queryset(user)
+        return filter_expenses(expenses, params, user) if params is not None else expenses
+
+    def list_ordering(self, params):
+        return SEARCH_ORDERING if 'q' in clean_filters(params) else self.ordering
+
+    def batch_context(self, user, operations):
+        # Read inside the batch's transaction, so a category deleted meanwhile is refused
+        ids = {int(value) for value in (data.get('category') for data in operations) if str(value).isdigit()}
+        return {'categories': list(Category.objects.filter(user=user, pk__in=ids)) if ids else []}
+
+    def form(self, user, data, instance=None, categories=()):
+        return ExpenseBatchForm(data, instance=instance, categories=categories)
+
+    def save(self, user, created, updated, deleted):
+        """Bulk write like the importer: rollups, caches and alerts are updated once per batch."""
+        new = []
+        for form in created:
+            expense = form.save(commit=False)
+            expense.user = user
+            new.append(expense)
+        changed = [form.save(commit=False) for _, form in updated]
+        if deleted:
+            # Deletes still pass through post_delete, which keeps rollups and alerts in step
+            Expense.objects.filter(pk__in=[expense.pk for expense in deleted]).delete()
+        save_expenses(user.pk, new, changed, previous=[original for original, _ in updated])
+        return new + changed
+
+
+class CategoryResource(Resource):
+    model = Category
+    form_class = CategoryForm
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'is_default': 'is_default',
+        'created_at': 'created_at',
+    }
+    ordering = ('name',)
+
+    def form(self, user, data, instance=None):
+        return self.form_class(data, instance=instance)
+
+
+class BudgetResource(Resource):
+    model = BudgetCap
+    form_class = BudgetCapForm
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'amount': 'amount',
+        'currency': 'currency',
+        'period': 'period',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'start_date': 'start_date',
+        'is_active': 'is_active',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    ordering = ('-created_at', '-id')
+
+
+expenses = ExpenseResource()
+categories = CategoryResource()
+budgets = BudgetResource()
+
+
+def _problems(resource, form, item, allowed=()):
+    """Errors of one operation shaped like Form.errors.get_json_data(), or None."""
+    unknown = set(item) - set(resource.writable) - set(allowed)
+    if unknown:
+        return {name: [{'message': 'Unknown or read-only field.', 'code': 'unknown'}] for name in sorted(unknown)}
+    return None if form.is_valid() else form.errors.get_json_data()
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _as_ids(values):
+    if not isinstance(values, list) or not all(_is_id(value) for value in values):
+        raise APIError(400, '"delete" must be a list of ids.')
+    return values
+
+
+def write_batch(resource, user, create=(), update=(), delete=()):
+    """
+    Validate every operation and then apply them all in one transaction.
+
+    ``create`` holds new objects, ``update`` partial objects with their
+    ``id`` and ``delete`` ids. Nothing is written unless every operation
+    is valid; the errors are reported per operation index.
+    """
+    limit = getattr(settings, 'API_MAX_BATCH_SIZE', 500)
+    if len(create) + len(update) + len(delete) > limit:
+        raise APIError(400, f'A batch holds at most {limit} operations.')
+    if not all(isinstance(item, dict) for item in [*create, *update]):
+        raise APIError(400, 'Objects to create and update must be JSON objects.')
+    if not all(_is_id(item.get('id')) for item in update):
+        raise APIError(400, 'Each update needs the "id" of its object.')
+    ids = [item.get('id') for item in update] + list(delete)
+    if len(set(ids)) != len(ids):
+        raise APIError(400, 'Each id may appear once per batch.')
+
+    errors = {'create': {}, 'update': {}, 'delete': {}}
+    created, updated = [], []
+    try:
+        with transaction.atomic():
+            found = resource.queryset(user).select_for_update().in_bulk(ids)
+            defaults = resource.defaults()
+            context = resource.batch_context(user, [
+                *({**defaults, **item} for item in create),
+                *({**resource.current(found[item['id']]), **item} for item in update if item['id'] in found),
+            ])
+            for index, item in enumerate(create):
+                form = resource.form(user, {**defaults, **item}, **context)
+                problems = _problems(resource, form, item)
+                if problems:
+                    errors['create'][index] = problems
+                created.append(form)
+            for index, item in enumerate(update):
+                original = found.get(item.get('id'))
+                if original is None:
+                    errors['update'][index] = {'id': [{'message': 'Not found.', 'code': 'not_found'}]}
+                    continue
+                # The form writes into a copy so the original keeps the previous state
+                form = resource.form(user, {**resource.current(original), **item}, instance=copy(original), **context)
+                problems = _problems(resource, form, item, allowed={'id'})
+                if problems:
+                    errors['update'][index] = problems
+                updated.append((original, form))
+            deleted = []
+            for index, pk in enumerate(delete):
+                if pk in found:
+                    deleted.append(found[pk])
+                else:
+                    errors['delete'][index] = {'id': [{'message': 'Not found.', 'code': 'not_found'}]}
+
+            if any(errors.values()):
+                raise APIError(400, 'The batch is invalid; nothing was written.',
+                               errors={name: problems for name, problems in errors.items() if problems})
+            saved = resource.save(user, created, updated, deleted)
+    except IntegrityError:
+        raise APIError(409, 'The batch conflicts with existing data; nothing was written.')
+    return saved[:len(created)], saved[len(created):], [instance.pk for instance in deleted]
+
+
+def fetch(resource, user, instances, selected):
+    """Serialize ``instances`` in order, reading them back with one .values() query."""
+    pks = [instance.pk for instance in instances]
+    if not pks:
+        return []
+    rows = {row['id']: row for row in resource.values(resource.queryset(user).filter(pk__in=pks), selected)}
+    return resource.serialize([rows[pk] for pk in pks], selected)
+
+
+@api_view('GET', 'POST')
+def collection(request, resource):
+    """
+    GET lists the user's objects a page at a time, in keyset order; the
+    response's ``next_cursor`` is passed back as ``cursor`` for the next
+    page. ``fields`` selects a comma-separated subset of fields; expenses
+    also take the expense list filters, and a ``q`` search lists the most
+    relevant first. POST creates one object.
+    """
+    selected = resource.select(request.GET)
+    if request.method == 'POST':
+        payload = read_json(request)
+        if not isinstance(payload, dict):
+            raise APIError(400, 'Send the new object as a JSON object.')
+        created, _, _ = write_batch(resource, request.user, create=[payload])
+        return JsonResponse(fetch(resource, request.user, created, selected)[0], status=201)
+
+    with reading_from_replica(request):
+        ordering = resource.list_ordering(request.GET)
+        rows = resource.values(resource.queryset(request.user, request.GET), selected, ordering)
+        try:
+            page, next_cursor = keyset_page(rows, request.GET.get('cursor'), request.GET.get('page_size'), ordering)
+        except ValueError as e:
+            raise APIError(400, str(e))
+        return JsonResponse({'results': resource.serialize(page, selected), 'next_cursor': next_cursor})
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def detail(request, resource, pk):
+    """GET reads one object, PATCH changes the fields it is sent and DELETE removes it."""
+    selected = resource.select(request.GET)
+    if request.method == 'GET':
+        row = resource.values(resource.queryset(request.user).filter(pk=pk), selected).first()
+        if row is None:
+            raise APIError(404, 'Not found.')
+        return JsonResponse(resource.serialize([row], selected)[0])
+
+    if not resource.queryset(request.user).filter(pk=pk).exists():
+        raise APIError(404, 'Not found.')
+    if request.method == 'DELETE':
+        write_batch(resource, request.user, delete=[pk])
+        return HttpResponse(status=204)
+    payload = read_json(request)
+    if not isinstance(payload, dict):
+        raise APIError(400, 'Send the changed fields as a JSON object.')
+    _, updated, _ = write_batch(resource, request.user, update=[{**payload, 'id': pk}])
+    return JsonResponse(fetch(resource, request.user, updated, selected)[0])
+
+
+@api_view('POST')
+def batch(request, resource):
+    """
+    Apply ``{"create": [...], "update": [...], "delete": [ids]}`` in one
+    transaction. Updates carry the ``id`` of the object and the fields to
+    change. Either every operation succeeds or nothing is written.
+    """
+    payload = read_json(request)
+    if not isinstance(payload, dict) or set(payload) - {'create', 'update', 'delete'}:
+        raise APIError(400, 'Send an object with "create", "update" and "delete" lists.')
+    create, update = payload.get('create', []), payload.get('update', [])
+    if not isinstance(create, list) or not isinstance(update, list):
+        raise APIError(400, '"create" and "update" must be lists of objects.')
+    selected = resource.select(request.GET)
+    created, updated, deleted = write_batch(
+        resource, request.user, create, update, _as_ids(payload.get('delete', [])),
+    )
+    return JsonResponse({
+        'created': fetch(resource, request.user, created, selected),
+        'updated': fetch(resource, request.user, updated, selected),
+        'deleted': deleted,
+    })
+
+
+@api_view('GET')
+def suggest_category(request):
+    """
+    The categories the user would most likely file an expense with this
+    ``description`` (and optionally ``amount``) under, most likely first.
+    """
+    try:
+        amount = Decimal(request.GET['amount']) if request.GET.get('amount') else None
+    except InvalidOperation:
+        raise APIError(400, '"amount" must be a number.')
+    if amount is not None and not amount.is_finite():
+        raise APIError(400, '"amount" must be a number.')
+    names = category_names(request.user)
+    suggestions = suggest_categories(request.user, request.GET.get('description', ''), amount)
+    return JsonResponse({'suggestions': [
+        {'category': category_id, 'name': names[category_id], 'probability': round(probability, 3)}
+        for category_id, probability in suggestions if category_id in names
+    ]})
+
+
+@api_view('GET')
+@replica_reads
+@conditional_on_data_version
+def analytics(request):
+    """The dashboard figures and the status of every active budget."""
+    metrics = get_dashboard_metrics(request.user, timezone.now().date(), request_data_version(request).version)
+    category_data, monthly_data = metrics['category_data'], metrics['monthly_data']
+    return JsonResponse({
+        'as_of': metrics['as_of'],
+        'total_expenses': metrics['total_expenses'],
+        'month_expenses': metrics['month_expenses'],
+        'week_expenses': metrics['week_expenses'],
+        'avg_daily': metrics['avg_daily'],
+        'categories': [
+            {'name': name, 'total': total}
+            for name, total in zip(category_data['labels'], category_data['values'])
+        ],
+        'monthly': [
+            {'month': month, 'total': total}
+            for month, total in zip(monthly_data['labels'], monthly_data['values'])
+        ],
+        'budgets': [{
+            'id': status.budget.pk,
+            'name': status.budget.name,
+            'period': status.budget.period,
+            'category': status.budget.category_id,
+            'amount': status.budget.amount,
+            'period_start': status.period_start,
+            'period_end': status.period_end,
+            'spent': status.spent,
+            'remaining': status.remaining,
+            'percent': status.percent,
+            'exceeded': status.exceeded,
+            'warning': status.is_warning,
+        } for status in evaluate_budgets(request.user)],
+    })
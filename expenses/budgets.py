@@ -0,0 +1,320 @@
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Case, Func, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .currency import base_currency, from_base, rates
+from .models import BudgetCap, SpendingRollup
+from .versioning import bump_history_version, get_data_version
+
+
+WARNING_THRESHOLD = 80
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+HISTORY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class BudgetStatus:
+    """Spending snapshot of a single budget for its current period."""
+    budget: BudgetCap
+    period_start: date
+    period_end: date
+    spent: Decimal
+    remaining: Decimal
+    percent: int
+    exceeded: bool
+    over_amount: Decimal
+
+    @property
+    def is_warning(self):
+        return not self.exceeded and self.percent >= WARNING_THRESHOLD
+
+
+def as_days(values):
+    """Convert a date, a sequence of dates or a datetime64 array to datetime64[D]."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        return values.astype('datetime64[D]')
+    if isinstance(values, date):
+        return np.datetime64(values.toordinal() - EPOCH_ORDINAL, 'D')
+    # Going through ordinals is far faster than letting NumPy parse date objects
+    values = list(values)
+    ordinals = np.fromiter((value.toordinal() for value in values), dtype=np.int64, count=len(values))
+    return (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+def clamp_day(month, day):
+    """First of ``month`` plus ``day`` days, clamped to the month's last day."""
+    first = month.astype('datetime64[D]')
+    length = ((month + 1).astype('datetime64[D]') - first).astype(np.int64)
+    return first + np.minimum(day, length - 1)
+
+
+def period_bounds(start_dates, periods, today):
+    """
+    Compute BudgetCap.get_period_dates for many budgets at once.
+
+    ``start_dates`` and ``periods`` are sequences of equal length and
+    ``today`` is a date or a sequence of dates; datetime64 arrays work too.
+    Returns (period_start, period_end) as datetime64[D] arrays, with the
+    same month-end clamping as the per-instance method.
+    """
+    start = as_days(start_dates)
+    periods = np.asarray(periods, dtype=object)
+    today = np.broadcast_to(as_days(today), start.shape)
+    weekly = periods == 'weekly'
+    monthly = periods == 'monthly'
+
+    week_start = start + (today - start).astype(np.int64) // 7 * 7
+
+    # Monthly periods begin in today's month and yearly ones in the start
+    # month of today's year, on the start day clamped to the month length
+    start_month = start.astype('datetime64[M]')
+    day = (start - start_month.astype('datetime64[D]')).astype(np.int64)
+    years = today.astype('datetime64[Y]').astype(np.int64) - start.astype('datetime64[Y]').astype(np.int64)
+    first_month = np.where(monthly, today.astype('datetime64[M]'), start_month + 12 * years)
+    next_month = first_month + np.where(monthly, 1, 12)
+
+    period_start = np.where(weekly, week_start, clamp_day(first_month, day))
+    period_end = np.where(weekly, week_start + 6, clamp_day(next_month, day) - 1)
+
+    before = today < start
+    return np.where(before, start, period_start), np.where(before, start, period_end)
+
+
+def budget_periods(budgets, today):
+    """Return the current (period_start, period_end) dates of every budget."""
+    if not budgets:
+        return []
+    starts, ends = period_bounds(
+        [budget.start_date for budget in budgets], [budget.period for budget in budgets], today,
+    )
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _window_key(budget, period_start, period_end):
+    return (period_start, period_end, budget.category_id)
+
+
+def _window_filter(key):
+    period_start, period_end, category_id = key
+    condition = Q(period__gte=period_start, period__lte=period_end)
+    if category_id is not None:
+        condition &= Q(category_id=category_id)
+    return condition
+
+
+def fetch_window_spending(user, windows):
+    """Sum the user's daily rollups for every (start, end, category_id) window in one query."""
+    windows = list(dict.fromkeys(windows))
+    if not windows:
+        return {}
+
+    aliases = {f'w{index}': key for index, key in enumerate(windows)}
+    totals = SpendingRollup.objects.filter(
+        user=user,
+        granularity=SpendingRollup.DAY,
+        period__gte=min(key[0] for key in windows),
+        period__lte=max(key[1] for key in windows),
+    ).aggregate(**{
+        alias: Sum('total', filter=_window_filter(key))
+        for alias, key in aliases.items()
+    })
+    return {key: totals[alias] or Decimal('0') for alias, key in aliases.items()}
+
+
+def _rate_day(period_end, today):
+    return min(period_end, today)
+
+
+def period_rates(budgets, periods, today):
+    """Look up, in one go, the rates converting spending into the currencies of ``budgets`` for ``periods``."""
+    return rates(
+        (budget.currency, _rate_day(period_end, today))
+        for budget, (_, period_end) in zip(budgets, periods) if budget.currency != base_currency()
+    )
+
+
+def build_status(budget, period_start, period_end, spent, today=None, known=None):
+    """
+    Status of ``budget`` given ``spent`` in the base currency, which is
+    converted at the period's last rate. ``known`` holds rates already looked
+    up with period_rates().
+    """
+    if today is None:
+        today = timezone.now().date()
+    spent = from_base(spent, budget.currency, _rate_day(period_end, today), known)
+    remaining = budget.amount - spent
+    if budget.amount > 0:
+        percent = min(100, int((spent / budget.amount) * 100))
+    else:
+        percent = 0
+    return BudgetStatus(
+        budget=budget,
+        period_start=period_start,
+        period_end=period_end,
+        spent=spent,
+        remaining=remaining,
+        percent=percent,
+        exceeded=spent > budget.amount,
+        over_amount=abs(remaining) if remaining < 0 else Decimal('0'),
+    )
+
+
+def evaluate_budgets(user, budgets=None, today=None):
+    """
+    Evaluate budgets of ``user`` for their current periods.
+
+    Defaults to the user's active budgets. The query count is constant:
+    one query for the budgets, one aggregate for every spending window and,
+    for budgets in other currencies, one lookup of their rates.
+    """
+    if budgets is None:
+        budgets = BudgetCap.objects.filter(user=user, is_active=True)
+    if hasattr(budgets, 'select_related'):
+        budgets = budgets.select_related('category')
+    budgets = list(budgets)
+    if today is None:
+        today = timezone.now().date()
+
+    periods = budget_periods(budgets, today)
+    spending = fetch_window_spending(
+        user,
+        [_window_key(budget, *period) for budget, period in zip(budgets, periods)],
+    )
+    known = period_rates(budgets, periods, today)
+    return [
+        build_status(budget, *period, spending[_window_key(budget, *period)], today, known)
+        for budget, period in zip(budgets, periods)
+    ]
+
+
+def split_alerts(statuses):
+    """Return the (exceeded, warning) statuses out of ``statuses``."""
+    exceeded = [status for status in statuses if status.exceeded]
+    warnings = [status for status in statuses if status.is_warning]
+    return exceeded, warnings
+
+
+class DayNumber(Func):
+    """Days between 1970-01-01 and a date expression, as an integer."""
+    template = "(%(expressions)s - DATE '1970-01-01')"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)',
+            **extra_context,
+        )
+
+
+def history_periods(budget, today):
+    """Return (period_start, period_end) of every period of ``budget`` up to the one containing ``today``."""
+    start = budget.start_date
+    if today < start:
+        return []
+    first = as_days(start)
+    if budget.period == 'weekly':
+        starts = first + 7 * np.arange((today - start).days // 7 + 2)
+    else:
+        step = 1 if budget.period == 'monthly' else 12
+        elapsed = (today.year - start.year) * 12 + today.month - start.month
+        months = first.astype('datetime64[M]') + step * np.arange(elapsed // step + 3)
+        starts = clamp_day(months, start.day - 1)
+    # Keep the periods begun by today plus the start of the next one
+    starts = starts[:np.searchsorted(starts, as_days(today), side='right') + 1]
+    return list(zip(starts[:-1].tolist(), (starts[1:] - 1).tolist()))
+
+
+def _period_index(budget, periods):
+    """SQL expression numbering the period of ``budget`` each rollup day falls in."""
+    start = budget.start_date
+    if budget.period == 'weekly':
+        return (DayNumber('period') - (start.toordinal() - EPOCH_ORDINAL)) / 7
+
+    # Days before the period boundary of their month belong to the previous
+    # period. Boundaries clamped to a shorter month end are listed explicitly.
+    before_boundary = Q(period__day__lt=start.day)
+    clamped = [period_start for period_start, _ in periods if period_start.day != start.day]
+    if clamped:
+        before_boundary &= ~Q(period__in=clamped)
+    if budget.period == 'monthly':
+        offset = (ExtractYear('period') - start.year) * 12 + ExtractMonth('period') - start.month
+        before = before_boundary
+    else:
+        offset = ExtractYear('period') - start.year
+        before = Q(period__month__lt=start.month) | (Q(period__month=start.month) & before_boundary)
+    return offset - Case(When(before, then=Value(1)), default=Value(0), output_field=IntegerField())
+
+
+def fetch_period_spending(budget, periods, since):
+    """Sum the daily rollups of ``budget`` per period index from ``since`` on in one query."""
+    rows = SpendingRollup.objects.filter(
+        user_id=budget.user_id,
+        granularity=SpendingRollup.DAY,
+        period__gte=since,
+        period__lte=periods[-1][1],
+    )
+    if budget.category_id is not None:
+        rows = rows.filter(category_id=budget.category_id)
+    rows = (
+        rows.annotate(period_index=_period_index(budget, periods))
+        .values('period_index')
+        .annotate(spent=Sum('total'))
+        .order_by()
+    )
+    return {int(row['period_index']): row['spent'] for row in rows}
+
+
+def invalidate_budget_history(user_id):
+    """
+    Drop the cached closed-period totals of ``user_id``'s budgets. The
+    generation lives in the database, so this reaches every process.
+    """
+    bump_history_version(user_id)
+
+
+def _history_key(budget, generation, period_start, period_end):
+    return (
+        f'expenses:budget-history:{budget.user_id}:{generation}:{budget.pk}:'
+        f'{budget.category_id}:{period_start.isoformat()}:{period_end.isoformat()}'
+    )
+
+
+def period_history(budget, today=None):
+    """
+    Return the status of ``budget`` in every period since its start date, oldest first.
+
+    Closed periods are cached per budget and period, so only the current
+    period and closed ones missing from the cache are summed, in one query.
+    Writes dated before today drop the user's cached periods.
+    """
+    if today is None:
+        today = timezone.now().date()
+    periods = history_periods(budget, today)
+    if not periods:
+        return []
+
+    generation = get_data_version(budget.user_id).history_version
+    keys = [_history_key(budget, generation, *period) for period in periods[:-1]]
+    cached = cache.get_many(keys)
+    missing = [index for index, key in enumerate(keys) if key not in cached]
+    since = periods[missing[0] if missing else -1][0]
+    spending = fetch_period_spending(budget, periods, since)
+    cache.set_many(
+        {keys[index]: spending.get(index, Decimal('0')) for index in missing}, HISTORY_CACHE_TIMEOUT,
+    )
+
+    known = period_rates([budget] * len(periods), periods, today)
+    statuses = []
+    for index, period in enumerate(periods):
+        if index < len(keys) and keys[index] in cached:
+            spent = cached[keys[index]]
+        else:
+            spent = spending.get(index, Decimal('0'))
+        statuses.append(build_status(budget, *period, spent, today, known))
+    return statuses
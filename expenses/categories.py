@@ -0,0 +1,71 @@
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+
+from .models import Category
+from .versioning import bump_categories_version, get_data_version
+
+
+CACHE_TIMEOUT = 60 * 60
+
+# Categories already read during the current request, keyed by user id
+_memo = ContextVar('expenses_category_memo', default=None)
+
+
+@receiver(request_started)
+def _start_memo(sender, **kwargs):
+    _memo.set({})
+
+
+@receiver(request_finished)
+def _clear_memo(sender, **kwargs):
+    _memo.set(None)
+
+
+def invalidate_categories(user_id):
+    """
+    Move the category cache of ``user_id`` to a new version.
+
+    The version is kept in the database, so processes that do not share a
+    cache move on too. Entries of older versions are never read again, so a
+    request that loaded categories just before the change cannot put stale
+    ones back.
+    """
+    if user_id is None:
+        return
+    bump_categories_version(user_id)
+    memo = _memo.get()
+    if memo is not None:
+        memo.pop(user_id, None)
+
+
+def user_categories(user, data_version=None):
+    """
+    Return the categories of ``user`` (a User or an id) ordered by name.
+
+    Costs a lookup of the user's DataVersion once per request, unless the
+    caller passes the ``data_version`` it already read, plus the categories
+    themselves when the cache has none for its categories version.
+    """
+    user_id = getattr(user, 'pk', user)
+    memo = _memo.get()
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+
+    if data_version is None:
+        data_version = get_data_version(user_id)
+    key = f'expenses:categories:{user_id}:{data_version.categories_version}'
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.filter(user_id=user_id).order_by('name'))
+        cache.set(key, categories, CACHE_TIMEOUT)
+    if memo is not None:
+        memo[user_id] = categories
+    return categories
+
+
+def category_names(user):
+    """Return ``{category_id: name}`` for the categories of ``user``."""
+    return {category.pk: category.name for category in user_categories(user)}
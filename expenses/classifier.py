@@ -0,0 +1,274 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from copy import copy
+from functools import partial
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import Expense
+from .versioning import bump_classifier_version, get_data_version
+
+
+# Description words are hashed into this many buckets, so a model's size
+# does not grow with a user's vocabulary
+FEATURES = 1 << 10
+MAX_WORDS = 50
+# Lidstone smoothing of the word counts
+SMOOTHING = 0.1
+TRAINING_CHUNK = 5000
+MAX_SUGGESTIONS = 3
+
+_WORD = re.compile(r'\w+')
+
+# Models of the most recently used users, oldest first
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+def features(description, amount=None):
+    """
+    Hashed buckets of the lower-cased words of ``description``, plus one
+    for the order of magnitude of ``amount``.
+    """
+    tokens = _WORD.findall((description or '').lower())[:MAX_WORDS]
+    if amount is not None and amount > 0:
+        tokens.append(f'amount:{math.floor(math.log2(amount))}')
+    return np.fromiter(
+        (zlib.crc32(token.encode()) % FEATURES for token in tokens), dtype=np.intp, count=len(tokens),
+    )
+
+
+class CategoryModel:
+    """
+    Multinomial naive Bayes over the hashed description words of one
+    user's categorized expenses.
+
+    Learning only adds and subtracts counts, so a changed expense moves
+    the model by its own words without retraining on the rest.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.category_ids = []
+        self.rows = {}
+        self.word_counts = np.zeros((0, FEATURES), dtype=np.float32)
+        self.example_counts = np.zeros(0, dtype=np.float32)
+        self._log_likelihoods = None
+
+    def _row(self, category_id):
+        row = self.rows.get(category_id)
+        if row is None:
+            row = self.rows[category_id] = len(self.category_ids)
+            self.category_ids.append(category_id)
+            self.word_counts = np.vstack([self.word_counts, np.zeros((1, FEATURES), dtype=np.float32)])
+            self.example_counts = np.append(self.example_counts, np.float32(0))
+        return row
+
+    def learn(self, examples, weight=1):
+        """Add ``(description, amount, category_id)`` examples, or remove them with ``weight=-1``."""
+        rows, words = [], []
+        for description, amount, category_id in examples:
+            row = self._row(category_id)
+            found = features(description, amount)
+            self.example_counts[row] += weight
+            rows.append(np.full(len(found), row))
+            words.append(found)
+        if rows:
+            np.add.at(self.word_counts, (np.concatenate(rows), np.concatenate(words)), weight)
+        if weight < 0:
+            np.maximum(self.word_counts, 0, out=self.word_counts)
+            np.maximum(self.example_counts, 0, out=self.example_counts)
+        self._log_likelihoods = None
+
+    def forget(self, category_id):
+        row = self.rows.get(category_id)
+        if row is not None:
+            self.word_counts[row] = 0
+            self.example_counts[row] = 0
+            self._log_likelihoods = None
+
+    def probabilities(self, word_lists):
+        """
+        Return the ids of the categories with examples and, per array of
+        ``word_lists``, the posterior probability of each of them.
+        """
+        active = np.flatnonzero(self.example_counts > 0)
+        # With a single category every answer would be that one at 100%
+        if len(active) < 2:
+            return [], np.zeros((len(word_lists), 0))
+        if self._log_likelihoods is None:
+            counts = self.word_counts[active]
+            totals = counts.sum(axis=1, keepdims=True)
+            self._log_likelihoods = np.log(counts + SMOOTHING) - np.log(totals + SMOOTHING * FEATURES)
+
+        documents = np.zeros((len(word_lists), FEATURES), dtype=np.float32)
+        for index, words in enumerate(word_lists):
+            np.add.at(documents[index], words, 1)
+        scores = documents @ self._log_likelihoods.T + np.log(self.example_counts[active])
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return [self.category_ids[row] for row in active], probabilities
+
+    def predict(self, word_lists):
+        """
+        Return the most likely ``(category_id, probability)`` for each array
+        of ``word_lists``; ``(None, 0.0)`` where the model cannot tell.
+        """
+        category_ids, probabilities = self.probabilities(word_lists)
+        if not category_ids:
+            return [(None, 0.0)] * len(word_lists)
+        best = probabilities.argmax(axis=1)
+        return [
+            (category_ids[column], float(probabilities[index, column])) if len(words) else (None, 0.0)
+            for index, (words, column) in enumerate(zip(word_lists, best))
+        ]
+
+    def rank(self, words, limit=MAX_SUGGESTIONS):
+        """The ``limit`` most likely ``(category_id, probability)`` pairs for one array of words."""
+        if not len(words):
+            return []
+        category_ids, probabilities = self.probabilities([words])
+        order = np.argsort(-probabilities[0], kind='stable')[:limit]
+        return [(category_ids[column], float(probabilities[0, column])) for column in order]
+
+
+def _current_version(user_id):
+    # Kept in the database, so a change made by any process reaches them all
+    return get_data_version(user_id).classifier_version
+
+
+def train(user_id, version=None):
+    """Build the model of ``user_id`` from their categorized expenses, a chunk at a time."""
+    model = CategoryModel(version)
+    examples = Expense.objects.filter(user_id=user_id, category__isnull=False).values_list(
+        'description', 'amount', 'category_id',
+    ).iterator(chunk_size=TRAINING_CHUNK)
+    while chunk := list(islice(examples, TRAINING_CHUNK)):
+        model.learn(chunk)
+    return model
+
+
+def user_model(user):
+    """
+    Return the model of ``user`` (a User or an id), training it if this
+    process holds none or only one older than the user's latest change.
+    """
+    user_id = getattr(user, 'pk', user)
+    version = _current_version(user_id)
+    with _lock:
+        model = _models.get(user_id)
+        if model is not None and model.version == version:
+            _models.move_to_end(user_id)
+            return model
+
+    model = train(user_id, version)
+    with _lock:
+        _models[user_id] = model
+        _models.move_to_end(user_id)
+        while len(_models) > getattr(settings, 'CLASSIFIER_CACHE_USERS', 200):
+            _models.popitem(last=False)
+    return model
+
+
+def _apply(user_id, change):
+    """
+    Move the user to a new version and apply ``change`` to the model this
+    process holds, when that model was current; otherwise drop it so the
+    next use retrains.
+    """
+    bump_classifier_version(user_id)
+    # A change made meanwhile by another process skips a version, which drops the model
+    version = _current_version(user_id)
+    with _lock:
+        model = _models.get(user_id)
+        if model is None:
+            return
+        if model.version == version - 1:
+            change(model)
+            model.version = version
+        else:
+            del _models[user_id]
+
+
+def _learn(removed, added, model):
+    model.learn(removed, weight=-1)
+    model.learn(added)
+
+
+def record_examples(removed=(), added=()):
+    """
+    Update the owners' models once the transaction commits: the
+    ``removed`` expenses as they were stored before a change, the
+    ``added`` ones as they are now. Uncategorized expenses teach nothing.
+    """
+    changes = {}
+    for side, expenses in enumerate((removed, added)):
+        for expense in expenses:
+            if expense is None or expense.user_id is None or expense.category_id is None:
+                continue
+            example = (expense.description, expense.amount, expense.category_id)
+            changes.setdefault(expense.user_id, (Counter(), Counter()))[side][example] += 1
+    for user_id, (old, new) in changes.items():
+        # Edits that leave description, amount and category alone change nothing
+        old, new = old - new, new - old
+        if old or new:
+            transaction.on_commit(partial(_apply, user_id, partial(_learn, list(old.elements()), list(new.elements()))))
+
+
+def forget_category(category):
+    """Drop a deleted category from its owner's model once the transaction commits."""
+    # Read the id now: Django clears it once the delete has run
+    category_id = category.pk
+    transaction.on_commit(partial(_apply, category.user_id, lambda model: model.forget(category_id)))
+
+
+def suggest_categories(user, description, amount=None, limit=MAX_SUGGESTIONS):
+    """Return up to ``limit`` ``(category_id, probability)`` pairs for a new expense, most likely first."""
+    words = features(description, amount)
+    if not len(words):
+        return []
+    model = user_model(user)
+    with _lock:
+        return model.rank(words, limit)
+
+
+def categorize_uncategorized(user, min_probability, batch_size=1000, dry_run=False):
+    """
+    Give each uncategorized expense of ``user`` its most likely category
+    where the model is at least ``min_probability`` sure. Returns the
+    number of expenses categorized and the number looked at.
+    """
+    from .writes import save_expenses
+
+    user_id = getattr(user, 'pk', user)
+    model = user_model(user_id)
+    pending = Expense.objects.filter(user_id=user_id, category__isnull=True).order_by('id')
+    assigned = examined = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(pending.filter(id__gt=last_id).select_for_update()[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            examined += len(batch)
+            with _lock:
+                predictions = model.predict([features(expense.description, expense.amount) for expense in batch])
+            previous, changed = [], []
+            for expense, (category_id, probability) in zip(batch, predictions):
+                if category_id is None or probability < min_probability:
+                    continue
+                previous.append(copy(expense))
+                expense.category_id = category_id
+                changed.append(expense)
+            assigned += len(changed)
+            if changed and not dry_run:
+                save_expenses(user_id, changed=changed, previous=previous, fields=['category'])
+    return assigned, examined
@@ -0,0 +1,227 @@
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce, Round
+
+from .models import ExchangeRate
+
+
+CENT = Decimal('0.01')
+RATE_PLACES = Decimal('0.00000001')
+CACHE_TIMEOUT = 60 * 60
+SYMBOLS = {'INR': '₹', 'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥'}
+
+_CURRENCIES_KEY = 'expenses:currencies'
+
+# Rates this process looked up, keyed by (currency, date), oldest first,
+# along with the version of the rate table they were read from
+_rates = OrderedDict()
+_held = {'version': None}
+_lock = threading.Lock()
+
+
+def base_currency():
+    return settings.BASE_CURRENCY
+
+
+def format_money(amount, currency=None, plain=False):
+    """``amount`` with the symbol of ``currency``, or its code when ``plain`` or without a symbol."""
+    currency = currency or base_currency()
+    symbol = None if plain else SYMBOLS.get(currency)
+    return f'{symbol}{amount}' if symbol else f'{currency} {amount}'
+
+
+def _current_version():
+    # Read from the table itself, so a load made by any process is seen by
+    # all of them, whether or not they share a cache
+    version = ExchangeRate.objects.aggregate(updated=Max('updated_at'), rows=Count('pk'))
+    return version['updated'], version['rows']
+
+
+def available_currencies():
+    """
+    The base currency followed by every currency with loaded rates, by
+    code. Other processes offer a newly loaded currency within CACHE_TIMEOUT.
+    """
+    currencies = cache.get(_CURRENCIES_KEY)
+    if currencies is None:
+        loaded = ExchangeRate.objects.exclude(currency=base_currency()).values_list('currency', flat=True)
+        currencies = [base_currency(), *sorted(set(loaded.distinct().order_by()))]
+        cache.set(_CURRENCIES_KEY, currencies, CACHE_TIMEOUT)
+    return currencies
+
+
+def converted_amount():
+    """
+    Expression for an expense's amount in the base currency, rounded to
+    cents. The rate of its currency and date comes from a join on (currency,
+    date); a day without a loaded rate takes the closest earlier one, or the
+    earliest when it precedes them all. Amounts in a currency without any
+    rates are NULL, which aggregates skip.
+    """
+    rates = ExchangeRate.objects.filter(currency=OuterRef('currency'))
+    rate = Coalesce(
+        F('exchange_rate__rate'),
+        Subquery(rates.filter(date__lt=OuterRef('date')).order_by('-date').values('rate')[:1]),
+        Subquery(rates.order_by('date').values('rate')[:1]),
+    )
+    return Case(
+        When(currency=base_currency(), then=F('amount')),
+        default=Round(F('amount') * rate, 2),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def _by_currency(pairs):
+    by_currency = {}
+    for currency, day in pairs:
+        by_currency.setdefault(currency, set()).add(day)
+    return by_currency
+
+
+def _fetch(pairs):
+    """
+    Read the rates of ``pairs`` in one query, plus up to two per currency
+    with days that have no rate of their own.
+    """
+    found = {
+        (currency, day): rate
+        for currency, day, rate in ExchangeRate.objects.filter(reduce(or_, (
+            Q(currency=currency, date__in=days) for currency, days in _by_currency(pairs).items()
+        ))).values_list('currency', 'date', 'rate')
+    }
+    for currency, days in _by_currency(pairs - found.keys()).items():
+        stored = ExchangeRate.objects.filter(currency=currency)
+        # Walk back from the latest of the days, each taking the closest earlier rate
+        pending = sorted(days, reverse=True)
+        earlier = stored.filter(date__lt=pending[0]).order_by('-date').values_list('date', 'rate')
+        for day, rate in earlier.iterator():
+            while pending and pending[0] > day:
+                found[currency, pending.pop(0)] = rate
+            if not pending:
+                break
+        if pending:
+            earliest = stored.order_by('date').values_list('rate', flat=True).first()
+            found.update(((currency, day), earliest) for day in pending)
+    return found
+
+
+def rates(pairs):
+    """
+    Return ``{(currency, date): rate}`` for ``pairs`` of currencies other
+    than the base one, the same rates converted_amount() picks in SQL.
+
+    Rates are held in a per-process LRU of settings.EXCHANGE_RATE_CACHE_SIZE
+    entries, valid while the rate table is unchanged, so converting the
+    expense a form saves usually costs only that check; the missing ones are
+    read together. A currency without any loaded rates maps to None.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    version = _current_version()
+    found = {}
+    with _lock:
+        if _held['version'] != version:
+            _rates.clear()
+            _held['version'] = version
+        for pair in pairs:
+            if pair in _rates:
+                _rates.move_to_end(pair)
+                found[pair] = _rates[pair]
+
+    missing = pairs - found.keys()
+    if missing:
+        fetched = _fetch(missing)
+        found.update(fetched)
+        with _lock:
+            if _held['version'] == version:
+                _rates.update(fetched)
+                while len(_rates) > getattr(settings, 'EXCHANGE_RATE_CACHE_SIZE', 4096):
+                    _rates.popitem(last=False)
+    return found
+
+
+def to_base(amount, currency, day, known=None):
+    """
+    ``amount`` of ``currency`` on ``day`` in the base currency, rounded like
+    converted_amount(); None without any rate. ``known`` holds rates
+    already looked up with rates().
+    """
+    if currency == base_currency():
+        return amount
+    rate = (known if known is not None and (currency, day) in known else rates([(currency, day)]))[currency, day]
+    if rate is None:
+        return None
+    return (amount * rate).quantize(CENT, ROUND_HALF_UP)
+
+
+def from_base(amount, currency, day, known=None):
+    """
+    An ``amount`` of the base currency in ``currency`` on ``day``; unchanged
+    without any rate. ``known`` holds rates already looked up with rates().
+    """
+    if currency == base_currency():
+        return amount
+    rate = (known if known is not None and (currency, day) in known else rates([(currency, day)]))[currency, day]
+    if not rate:
+        return amount
+    return (amount / rate).quantize(CENT, ROUND_HALF_UP)
+
+
+def load_rates(rows, batch_size=1000):
+    """
+    Store ``(currency, date, rate)`` rows of daily rates, filling the days
+    between two rates of a currency with the earlier one, so the join of
+    converted_amount() finds a row for every day they cover.
+
+    Returns the number of rows written and, per currency whose rates
+    changed, the first date whose conversions changed: None when expenses
+    dated before the earliest rate (which borrow it) changed as well.
+    """
+    given = {}
+    for currency, day, rate in rows:
+        currency, rate = currency.strip().upper(), Decimal(rate).quantize(RATE_PLACES)
+        if currency == base_currency():
+            raise ValueError(f'{currency} is the base currency; its rate is always 1.')
+        if len(currency) != 3 or rate <= 0:
+            raise ValueError(f'Invalid rate {rate} for currency "{currency}".')
+        given.setdefault(currency, {})[day] = rate
+
+    written, changed = 0, {}
+    with transaction.atomic():
+        for currency, daily in given.items():
+            days = sorted(daily)
+            filled = {}
+            for day, following in zip(days, days[1:] + [days[-1] + timedelta(days=1)]):
+                rate = daily[day]
+                while day < following:
+                    filled[day] = rate
+                    day += timedelta(days=1)
+            stored = ExchangeRate.objects.filter(currency=currency)
+            first = stored.order_by('date').values_list('date', flat=True).first()
+            existing = dict(stored.filter(date__range=(days[0], days[-1])).values_list('date', 'rate'))
+            new = [
+                ExchangeRate(currency=currency, date=day, rate=rate)
+                for day, rate in filled.items() if existing.get(day) != rate
+            ]
+            if not new:
+                continue
+            ExchangeRate.objects.bulk_create(
+                new, batch_size=batch_size, update_conflicts=True,
+                unique_fields=['currency', 'date'], update_fields=['rate', 'updated_at'],
+            )
+            written += len(new)
+            since = min(row.date for row in new)
+            changed[currency] = None if first is None or since <= first else since
+        if changed:
+            transaction.on_commit(lambda: cache.delete(_CURRENCIES_KEY))
+    return written, changed
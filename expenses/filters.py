@@ -0,0 +1,49 @@
+from datetime import date
+
+from .search import search_expenses, search_words
+
+
+MAX_QUERY_LENGTH = 200
+
+
+def parse_date_param(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def clean_filters(params):
+    """Return the valid expense list filters in ``params`` as a plain dict of strings"""
+    filters = {}
+    category = params.get('category')
+    if category and category.isdigit():
+        filters['category'] = category
+    for name in ('from_date', 'to_date'):
+        value = parse_date_param(params.get(name))
+        if value:
+            filters[name] = value.isoformat()
+    query = (params.get('q') or '').strip()[:MAX_QUERY_LENGTH]
+    if search_words(query):
+        filters['q'] = query
+    return filters
+
+
+def filter_expenses(expenses, params, user=None):
+    """
+    Apply the search, category and date range filters of the expense list to ``expenses``
+
+    A search also annotates ``search_rank``; pass the ``user`` owning the
+    expenses so it only looks at their part of the index.
+    """
+    filters = clean_filters(params)
+    
+    if 'q' in filters:
+        expenses = search_expenses(expenses, filters['q'], user)
+    if 'category' in filters:
+        expenses = expenses.filter(category__id=filters['category'])
+    if 'from_date' in filters:
+        expenses = expenses.filter(date__gte=filters['from_date'])
+    if 'to_date' in filters:
+        expenses = expenses.filter(date__lte=filters['to_date'])
+    return expenses
@@ -0,0 +1,274 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+import numpy as np
+from django.utils import timezone
+
+from .currency import format_money
+from .metrics import month_start
+from .models import SpendingRollup
+
+
+HISTORY_MONTHS = 24
+SEASON = 12
+HOLDOUT = 3
+SMOOTHING_LEVELS = np.linspace(0.1, 0.9, 9)
+# Two-sided 80% interval of a normal forecast error
+INTERVAL_Z = 1.2816
+
+MODELS = ('seasonal naive', 'exponential smoothing', 'linear trend')
+DEFAULT_MODEL = 1
+
+
+@dataclass(frozen=True)
+class ForecastPoint:
+    month: object
+    point: Decimal
+    lower: Decimal
+    upper: Decimal
+
+
+@dataclass(frozen=True)
+class CategoryForecast:
+    name: str
+    model: str
+    points: tuple
+
+
+@dataclass(frozen=True)
+class UserForecast:
+    months: tuple
+    categories: tuple
+    total: tuple
+
+
+def _rmse(residuals, mask):
+    count = mask.sum(axis=1)
+    sse = np.where(mask, residuals ** 2, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, np.sqrt(sse / count), np.nan)
+
+
+def seasonal_naive(history, start, horizon):
+    """Repeat the value of the same month a year earlier, or the last value without one."""
+    series, months = history.shape
+    steps = np.arange(horizon)
+    source = months - SEASON + steps % SEASON
+    usable = (source >= 0)[None, :] & (source[None, :] >= start[:, None])
+    points = np.where(usable, history[:, np.clip(source, 0, None)], history[:, -1:])
+
+    t = np.arange(1, months)
+    naive_sigma = _rmse(history[:, 1:] - history[:, :-1], t[None, :] > start[:, None])
+    if months > SEASON:
+        t = np.arange(SEASON, months)
+        seasonal_mask = (t - SEASON)[None, :] >= start[:, None]
+        sigma = _rmse(history[:, SEASON:] - history[:, :-SEASON], seasonal_mask)
+        sigma = np.where(np.isnan(sigma), naive_sigma, sigma)
+    else:
+        sigma = naive_sigma
+    return points, np.repeat(sigma[:, None], horizon, axis=1)
+
+
+def exponential_smoothing(history, start, horizon):
+    """
+    Simple exponential smoothing with the smoothing level picked per series.
+
+    Every level in SMOOTHING_LEVELS is run over every series at once; each
+    series keeps the level with the smallest one-step-ahead error.
+    """
+    series, months = history.shape
+    alpha = SMOOTHING_LEVELS[:, None]
+    level = np.zeros((len(SMOOTHING_LEVELS), series))
+    sse = np.zeros_like(level)
+    observed = np.zeros(series)
+    for t in range(months):
+        value = history[:, t]
+        first = t == start
+        later = t > start
+        error = value - level
+        sse += np.where(later, error ** 2, 0.0)
+        level = np.where(first, value, np.where(later, level + alpha * error, level))
+        observed += later
+
+    best = sse.argmin(axis=0)
+    rows = np.arange(series)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma = np.where(observed > 0, np.sqrt(sse[best, rows] / observed), np.nan)
+    steps = np.arange(horizon)
+    growth = np.sqrt(1 + steps[None, :] * SMOOTHING_LEVELS[best][:, None] ** 2)
+    points = np.repeat(level[best, rows][:, None], horizon, axis=1)
+    return points, sigma[:, None] * growth
+
+
+def linear_trend(history, start, horizon):
+    """Least-squares line through each series, with the usual prediction interval."""
+    series, months = history.shape
+    t = np.arange(months, dtype=float)
+    weight = (t[None, :] >= start[:, None]).astype(float)
+    n = weight.sum(axis=1)
+    sx = weight @ t
+    sy = (weight * history).sum(axis=1)
+    sxx = weight @ (t ** 2)
+    sxy = (weight * history) @ t
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spread = sxx - sx ** 2 / n
+        slope = np.where(spread > 0, (sxy - sx * sy / n) / spread, 0.0)
+        intercept = np.where(n > 0, (sy - slope * sx) / n, 0.0)
+        residuals = history - (intercept[:, None] + slope[:, None] * t[None, :])
+        sse = (weight * residuals ** 2).sum(axis=1)
+        sigma = np.where(n > 2, np.sqrt(sse / (n - 2)), np.nan)
+
+        future = np.arange(months, months + horizon, dtype=float)
+        points = intercept[:, None] + slope[:, None] * future[None, :]
+        leverage = 1 + 1 / n[:, None] + (future[None, :] - (sx / n)[:, None]) ** 2 / spread[:, None]
+        leverage = np.where(spread[:, None] > 0, leverage, 1.0)
+    return points, sigma[:, None] * np.sqrt(leverage)
+
+
+def _all_models(history, start, horizon):
+    fits = [model(history, start, horizon) for model in (seasonal_naive, exponential_smoothing, linear_trend)]
+    return np.stack([points for points, _ in fits]), np.stack([sigma for _, sigma in fits])
+
+
+def fit_forecasts(history, start, horizon):
+    """
+    Forecast ``horizon`` months for every row of ``history`` in one batch.
+
+    ``history`` is a (series, months) array of monthly totals, oldest month
+    first, and ``start`` the index of each series' first observed month.
+    Every model is fitted to every series; each series then uses the model
+    with the smallest error over its last HOLDOUT months, refitted on the
+    full history. Series too short for the holdout use exponential smoothing.
+
+    Returns (points, lower, upper, sigma, model) arrays; ``model`` indexes
+    MODELS. Series with too little history to estimate an error get an
+    interval as wide as the forecast itself.
+    """
+    history = np.asarray(history, dtype=float)
+    start = np.asarray(start, dtype=int)
+    series, months = history.shape
+
+    model = np.full(series, DEFAULT_MODEL)
+    trainable = start <= months - HOLDOUT - 2
+    if months > HOLDOUT + 2 and trainable.any():
+        trial, _ = _all_models(history[:, :-HOLDOUT], start, HOLDOUT)
+        error = np.abs(trial - history[None, :, -HOLDOUT:]).mean(axis=2)
+        model = np.where(trainable, error.argmin(axis=0), model)
+
+    points, sigma = _all_models(history, start, horizon)
+    rows = np.arange(series)
+    points = np.clip(points[model, rows], 0, None)
+    sigma = sigma[model, rows]
+    sigma = np.where(np.isnan(sigma), points, sigma)
+    lower = np.clip(points - INTERVAL_Z * sigma, 0, None)
+    upper = points + INTERVAL_Z * sigma
+    return points, lower, upper, sigma, model
+
+
+def load_monthly_series(users, today):
+    """
+    Load the closed months of every user's category spending in one query.
+
+    Returns (months, keys, history, start): ``keys`` holds a (user_id,
+    category name) pair per row of ``history``, and ``start`` the index of
+    the user's first month with any spending in the window.
+    """
+    months = [month_start(today, back) for back in range(HISTORY_MONTHS, 0, -1)]
+    index = {month: position for position, month in enumerate(months)}
+    rows = SpendingRollup.objects.filter(
+        user__in=users, granularity=SpendingRollup.MONTH,
+        period__gte=months[0], period__lt=month_start(today),
+    ).values_list('user_id', 'category__name', 'period', 'total')
+
+    keys = {}
+    cells = []
+    first_month = {}
+    for user_id, category_name, period, total in rows:
+        key = (user_id, category_name or 'Uncategorized')
+        row = keys.setdefault(key, len(keys))
+        cells.append((row, index[period], float(total)))
+        first_month[user_id] = min(first_month.get(user_id, len(months)), index[period])
+
+    history = np.zeros((len(keys), len(months)))
+    for row, column, total in cells:
+        history[row, column] += total
+    start = np.array([first_month[user_id] for user_id, _ in keys], dtype=int)
+    return months, list(keys), history, start
+
+
+def _money(value):
+    return Decimal(f'{value:.2f}')
+
+
+def forecast_users(users, today=None, horizon=2):
+    """
+    Forecast monthly spending per category for many users in one pass.
+
+    The first forecast month is the current, still open month. Returns a
+    dict of UserForecast keyed by user id; users without any closed month
+    of spending in the window are left out.
+    """
+    if today is None:
+        today = timezone.now().date()
+    months, keys, history, start = load_monthly_series(users, today)
+    future = tuple(month_start(today, -step) for step in range(horizon))
+    if not keys:
+        return {}
+
+    points, lower, upper, sigma, model = fit_forecasts(history, start, horizon)
+    grouped = {}
+    for row, (user_id, name) in enumerate(keys):
+        grouped.setdefault(user_id, []).append(row)
+
+    forecasts = {}
+    for user_id, rows in grouped.items():
+        categories = tuple(sorted(
+            (CategoryForecast(
+                name=keys[row][1],
+                model=MODELS[model[row]],
+                points=tuple(
+                    ForecastPoint(month, _money(points[row, step]), _money(lower[row, step]), _money(upper[row, step]))
+                    for step, month in enumerate(future)
+                ),
+            ) for row in rows),
+            key=lambda category: category.points[-1].point, reverse=True,
+        ))
+        # Category errors are treated as independent
+        total = points[rows].sum(axis=0)
+        total_sigma = np.sqrt((sigma[rows] ** 2).sum(axis=0))
+        forecasts[user_id] = UserForecast(
+            months=future,
+            categories=categories,
+            total=tuple(
+                ForecastPoint(
+                    month, _money(total[step]),
+                    _money(max(total[step] - INTERVAL_Z * total_sigma[step], 0)),
+                    _money(total[step] + INTERVAL_Z * total_sigma[step]),
+                )
+                for step, month in enumerate(future)
+            ),
+        )
+    return forecasts
+
+
+def forecast_user(user, today=None, horizon=2):
+    return forecast_users([user], today=today, horizon=horizon).get(user.pk)
+
+
+def format_forecast(forecast):
+    """Describe a UserForecast's last month in plain text, for prompts and answers."""
+    if forecast is None:
+        return 'Forecast: not enough spending history yet.'
+    total = forecast.total[-1]
+    lines = [
+        f"Forecast for {total.month.strftime('%B %Y')}: {format_money(total.point)} "
+        f"(80% range {format_money(total.lower)} to {format_money(total.upper)})"
+    ]
+    for category in forecast.categories:
+        point = category.points[-1]
+        lines.append(
+            f"Forecast {category.name}: {format_money(point.point)} "
+            f"({format_money(point.lower)} to {format_money(point.upper)}, {category.model})"
+        )
+    return '\n'.join(lines)
@@ -1,5 +1,49 @@
 from django import forms
-from .models import Expense, BudgetCap, Category
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .categories import user_categories
+from .currency import available_currencies, base_currency
+from .models import Expense, BudgetCap, Category, RecurringExpense
+from .recurring import reschedule
+
+
+class UserCategoryField(forms.ModelChoiceField):
+    """Category choice that renders and validates against the cached categories of one user"""
+    categories = None
+    
+    def use_categories(self, categories):
+        self.categories = {str(category.pk): category for category in categories}
+        empty = [('', self.empty_label)] if self.empty_label is not None else []
+        self.choices = empty + [(category.pk, self.label_from_instance(category)) for category in categories]
+    
+    def to_python(self, value):
+        if self.categories is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        if isinstance(value, Category):
+            value = value.pk
+        category = self.categories.get(str(value))
+        if category is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        return category
+
+
+def currency_choices():
+    return [(currency, currency) for currency in available_currencies()]
+
+
+class CurrencyField(forms.ChoiceField):
+    """Choice of the base currency or one with loaded exchange rates; left blank it means the base currency"""
+    def __init__(self, **kwargs):
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('widget', forms.Select(attrs={'class': 'form-control'}))
+        super().__init__(choices=currency_choices, **kwargs)
+    
+    def clean(self, value):
+        return super().clean(value) or base_currency()
 
 
 class CategoryForm(forms.ModelForm):
@@ -16,9 +60,12 @@ class CategoryForm(forms.ModelForm):
 
 
 class ExpenseForm(forms.ModelForm):
+    currency = CurrencyField()
+    
     class Meta:
         model = Expense
-        fields = ['category', 'amount', 'date', 'description']
+        fields = ['category', 'amount', 'currency', 'date', 'description']
+        field_classes = {'category': UserCategoryField}
         widgets = {
             'category': forms.Select(attrs={
                 'class': 'form-control',
@@ -44,15 +91,64 @@ class ExpenseForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         
-        # Filter categories for the current user
-        if user:
+        # Offer only the current user's categories, served from the category cache
+        if user and 'category' in self.fields:
             self.fields['category'].queryset = Category.objects.filter(user=user).order_by('name')
+            self.fields['category'].use_categories(user_categories(user))
+
+
+class ExpenseRowForm(ExpenseForm):
+    """Validates one imported row with the ExpenseForm rules; the category is resolved by name"""
+    class Meta(ExpenseForm.Meta):
+        fields = ['amount', 'currency', 'date', 'description']
+
+
+class ExpenseBatchForm(ExpenseForm):
+    """
+    Validates one operation of an API batch with the ExpenseForm rules. The
+    category is checked against ``categories``, read from the database once
+    for the whole batch, rather than with a query per row.
+    """
+    # Declared outside Meta.fields, so the model does not look it up again
+    category = UserCategoryField(queryset=Category.objects.none(), required=False)
+    
+    class Meta(ExpenseForm.Meta):
+        fields = ['amount', 'currency', 'date', 'description']
+    
+    def __init__(self, *args, categories=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['category'].use_categories(categories)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'category' in cleaned_data:
+            self.instance.category = cleaned_data['category']
+        return cleaned_data
+
+
+class ExpenseImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('auto', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+    ]
+    
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={
+        'class': 'form-control',
+        'accept': '.csv,.json,.jsonl',
+    }))
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, initial='auto', widget=forms.Select(attrs={
+        'class': 'form-control',
+    }))
 
 
 class BudgetCapForm(forms.ModelForm):
+    currency = CurrencyField()
+    
     class Meta:
         model = BudgetCap
-        fields = ['name', 'amount', 'period', 'category']
+        fields = ['name', 'amount', 'currency', 'period', 'category']
+        field_classes = {'category': UserCategoryField}
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -75,10 +171,69 @@ class BudgetCapForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         
-        # Filter categories for the current user
-        if user:
+        # Offer only the current user's categories, served from the category cache
+        if user and 'category' in self.fields:
             self.fields['category'].queryset = Category.objects.filter(user=user).order_by('name')
+            self.fields['category'].use_categories(user_categories(user))
         
         # Make category optional
         self.fields['category'].required = False
         self.fields['category'].help_text = "Leave blank to apply to all categories"
+
+
+class RecurringExpenseForm(forms.ModelForm):
+    currency = CurrencyField()
+    
+    class Meta:
+        model = RecurringExpense
+        fields = ['description', 'category', 'amount', 'currency', 'frequency', 'start_date', 'end_date', 'is_active']
+        field_classes = {'category': UserCategoryField}
+        widgets = {
+            'description': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'e.g. Rent, Netflix'
+            }),
+            'category': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'amount': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.01',
+                'placeholder': 'Enter amount'
+            }),
+            'frequency': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'start_date': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }),
+            'end_date': forms.DateInput(attrs={
+                'class': 'form-control',
+                'type': 'date'
+            }),
+            'is_active': forms.CheckboxInput(attrs={
+                'class': 'form-check-input'
+            }),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        
+        if user and 'category' in self.fields:
+            self.fields['category'].queryset = Category.objects.filter(user=user).order_by('name')
+            self.fields['category'].use_categories(user_categories(user))
+        self.fields['end_date'].help_text = "Leave blank to repeat until stopped"
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', "End date cannot be before the start date")
+        return cleaned_data
+    
+    def save(self, commit=True):
+        resumed = self.instance.pk is not None and self.instance.is_active and 'is_active' in self.changed_data
+        reschedule(self.instance, timezone.localdate() if resumed else None)
+        return super().save(commit)
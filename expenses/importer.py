@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .alerts import record_transitions
+from .budgets import evaluate_budgets, split_alerts
+from .categories import user_categories
+from .classifier import record_examples
+from .forms import ExpenseRowForm
+from .models import Expense
+from .rollups import apply_deltas, expense_deltas
+from .versioning import bump_data_version
+
+
+# currency is optional; rows without it are in the base currency
+COLUMNS = ('date', 'category', 'amount', 'currency', 'description')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)
+    exceeded_budgets: list = field(default_factory=list)
+    warning_budgets: list = field(default_factory=list)
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+
+def detect_format(filename, declared='auto'):
+    if declared in ('csv', 'json'):
+        return declared
+    if filename.lower().endswith(('.json', '.jsonl', '.ndjson')):
+        return 'json'
+    return 'csv'
+
+
+def iter_csv_rows(stream):
+    """Yield rows of a CSV export as dicts with lower-cased column names"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+
+def iter_json_rows(stream, chunk_size=64 * 1024):
+    """
+    Yield the objects of a JSON array or JSON Lines document.
+
+    The text is read ``chunk_size`` characters at a time and decoded one
+    object at a time, so the whole document is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        # Array brackets and separators between objects carry no data
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if not buffer:
+            if eof:
+                return
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('The JSON document is malformed or truncated.')
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        if isinstance(value, dict):
+            value = {str(key).strip().lower(): item for key, item in value.items()}
+        yield value
+
+
+def open_text(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+def import_expenses(user, fileobj, file_format='csv', batch_size=1000):
+    """
+    Import expenses for ``user`` from a CSV or JSON file object.
+
+    Rows are validated with the ExpenseForm rules and inserted with
+    bulk_create in batches of ``batch_size`` inside one transaction. The
+    rollups, the dashboard cache, the data version, the budget alerts and
+    the category classifier are each updated once for the whole import.
+    """
+    stream = open_text(fileobj)
+    rows = iter_json_rows(stream) if file_format == 'json' else iter_csv_rows(stream)
+    categories = {category.name.lower(): category for category in user_categories(user)}
+    result = ImportResult()
+    deltas = {}
+    batch = []
+
+    def flush():
+        Expense.objects.bulk_create(batch)
+        expense_deltas(batch, deltas=deltas)
+        record_examples(added=batch)
+        result.created += len(batch)
+        batch.clear()
+
+    with transaction.atomic():
+        try:
+            for row_number, row in enumerate(rows, start=1):
+                expense = _build_expense(user, row, row_number, categories, result)
+                if expense is not None:
+                    batch.append(expense)
+                    if len(batch) >= batch_size:
+                        flush()
+        except (ValueError, csv.Error, UnicodeDecodeError) as e:
+            result.add_error(None, str(e))
+        flush()
+        apply_deltas(deltas)
+
+    if result.created:
+        bump_data_version(user.pk)
+    statuses = evaluate_budgets(user)
+    record_transitions(statuses)
+    result.exceeded_budgets, result.warning_budgets = split_alerts(statuses)
+    return result
+
+
+def _build_expense(user, row, row_number, categories, result):
+    if not isinstance(row, dict):
+        result.add_error(row_number, 'Expected an object with date, category, amount and description.')
+        return None
+
+    data = {name: row.get(name) for name in COLUMNS}
+    data = {name: '' if value is None else str(value).strip() for name, value in data.items()}
+
+    category = categories.get(data['category'].lower())
+    # Exports write "Uncategorized" for expenses without a category
+    if category is None and data['category'].lower() not in ('', 'uncategorized'):
+        result.add_error(row_number, f'Unknown category "{data["category"]}".')
+        return None
+
+    form = ExpenseRowForm(data)
+    if not form.is_valid():
+        for name, messages in form.errors.items():
+            label = name if name != '__all__' else 'row'
+            result.add_error(row_number, f'{label}: {" ".join(messages)}')
+        return None
+
+    expense = form.save(commit=False)
+    expense.user = user
+    expense.category = category
+    return expense
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.classifier import categorize_uncategorized
+from expenses.models import Expense
+
+
+class Command(BaseCommand):
+    help = "File uncategorized expenses under the category each user's history makes most likely."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the user with this username.')
+        parser.add_argument(
+            '--min-probability', type=float, default=0.8,
+            help='Leave expenses uncategorized unless the best category is at least this likely.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Count what would change without writing.')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['min_probability'] <= 1:
+            raise CommandError('--min-probability must be between 0 and 1.')
+        pending = Expense.objects.filter(category__isnull=True, user__isnull=False)
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist.')
+            pending = pending.filter(user=user)
+
+        assigned = examined = 0
+        for user_id in pending.order_by('user_id').values_list('user_id', flat=True).distinct():
+            categorized, seen = categorize_uncategorized(
+                user_id, options['min_probability'], options['batch_size'], options['dry_run'],
+            )
+            assigned += categorized
+            examined += seen
+        verb = 'Would categorize' if options['dry_run'] else 'Categorized'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {assigned} of {examined} uncategorized expenses.'))
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.importer import detect_format, import_expenses
+
+
+class Command(BaseCommand):
+    help = 'Import expenses for a user from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['auto', 'csv', 'json'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist.')
+
+        file_format = detect_format(options['path'], options['format'])
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_expenses(user, fileobj, file_format, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for row_number, message in result.errors:
+            self.stderr.write(f'Row {row_number or "-"}: {message}')
+        for status in result.exceeded_budgets:
+            self.stdout.write(self.style.WARNING(f'Budget exceeded: {status.budget.name}'))
+        for status in result.warning_budgets:
+            self.stdout.write(self.style.WARNING(f'Budget at {status.percent}%: {status.budget.name}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} expenses, {len(result.errors)} rows rejected.'
+        ))
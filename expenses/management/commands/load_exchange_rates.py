@@ -0,0 +1,52 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.currency import load_rates
+from expenses.writes import reconvert_expenses
+
+
+def read_rates(fileobj, file_format):
+    """Yield ``(currency, date, rate)`` from CSV with date, currency and rate columns, or a JSON array of objects."""
+    if file_format == 'json':
+        rows = json.load(fileobj)
+    else:
+        rows = csv.DictReader(fileobj)
+    for number, row in enumerate(rows, start=1):
+        row = {(key or '').strip().lower(): str(value or '').strip() for key, value in row.items()}
+        try:
+            yield row['currency'], date.fromisoformat(row['date']), Decimal(row['rate'])
+        except (KeyError, ValueError, InvalidOperation):
+            raise CommandError(f'Row {number}: expected a date, a currency and a rate, got {row}.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load daily exchange rates into the base currency from a CSV or JSON file, '
+        'then rebuild the rollups of users whose expenses they convert.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['auto', 'csv', 'json'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if file_format == 'auto':
+            file_format = 'json' if options['path'].lower().endswith('.json') else 'csv'
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as fileobj:
+                written, changed = load_rates(read_rates(fileobj, file_format), batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        except ValueError as e:
+            raise CommandError(f'Invalid rates file: {e}')
+
+        users = reconvert_expenses(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {written} rates for {len(changed)} currencies; rebuilt the rollups of {len(users)} users.'
+        ))
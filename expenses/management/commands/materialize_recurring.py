@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.recurring import materialize_recurring
+
+
+class Command(BaseCommand):
+    help = (
+        'Add the expenses of every recurring expense due by today, catching up on any missed runs. '
+        'Safe to run repeatedly, e.g. hourly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Materialize occurrences due by this YYYY-MM-DD date instead of today.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Recurring expenses per transaction.')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f'Invalid date "{options["date"]}"; use YYYY-MM-DD.')
+
+        created, due = materialize_recurring(today, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Added {created} expenses from {due} recurring expenses.'))
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.rollups import rebuild_rollups, verify_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the spending rollups from the expense table, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the user with this username.')
+        parser.add_argument('--verify', action='store_true', help='Report drifted rows instead of rebuilding.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist.')
+
+        if not options['verify']:
+            created = rebuild_rollups(user)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} rollup rows.'))
+            return
+
+        mismatches = verify_rollups(user)
+        for key, expected, actual in mismatches:
+            self.stdout.write(f'{key}: expected {expected}, found {actual}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} rollup rows have drifted.')
+        self.stdout.write(self.style.SUCCESS('Rollups are consistent.'))
@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from expenses.report_worker import init_worker, run_job
+from expenses.reports import claim_next_job, render_report, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Render queued PDF reports in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Size of the process pool; 0 renders in this process.')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between checks of an empty queue.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained.')
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 0:
+            self.run_inline(options)
+            return
+
+        pool = ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=get_context('spawn'), initializer=init_worker,
+        )
+        running = {}
+        with pool:
+            while True:
+                requeue_stale_jobs()
+                while len(running) < options['workers']:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    running[pool.submit(run_job, job.pk)] = job.pk
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        # The job stays running until requeue_stale_jobs() picks it up again
+                        status = f'crashed ({e})'
+                    self.report(job_id, status)
+
+    def run_inline(self, options):
+        while True:
+            requeue_stale_jobs()
+            job = claim_next_job()
+            if job is not None:
+                self.report(job.pk, render_report(job.pk))
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['poll_interval'])
+
+    def report(self, job_id, status):
+        self.stdout.write(f'Report job {job_id}: {status}')
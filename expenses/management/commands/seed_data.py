@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.seeding import seed_synthetic_data
+
+
+class Command(BaseCommand):
+    help = 'Create users with synthetic expenses, categories and budgets for development and benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--expenses', type=int, default=1000, help='Expenses per user.')
+        parser.add_argument('--years', type=int, default=2, help='Spread expenses over this many years.')
+        parser.add_argument('--categories', type=int, default=8, help='Categories per user.')
+        parser.add_argument('--budgets', type=int, default=4, help='Budgets per user.')
+        parser.add_argument('--prefix', default='demo', help='Usernames are the prefix plus a number.')
+        parser.add_argument('--password', default='demo-pass-123')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for repeatable data.')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'Users with the prefix "{options["prefix"]}" already exist; pick another --prefix.')
+
+        users = seed_synthetic_data(
+            users=options['users'], expenses_per_user=options['expenses'], years=options['years'],
+            categories=options['categories'], budgets=options['budgets'], prefix=options['prefix'],
+            password=options['password'], seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(users)} users with {len(users) * options["expenses"]} expenses '
+            f'(log in as {options["prefix"]}0 / {options["password"]}).'
+        ))
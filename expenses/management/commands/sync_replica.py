@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the replica file, standing in for replication '
+        'when trying read-replica routing locally with two SQLite files.'
+    )
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'DATABASE_REPLICA', None)
+        if alias is None:
+            raise CommandError('No replica configured; set DATABASE_REPLICA_URL.')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases; use real replication otherwise.')
+
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {primary.settings_dict["NAME"]} to {replica.settings_dict["NAME"]}.'
+        ))
@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, DateField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import SpendingRollup
+from .versioning import get_data_version
+
+
+TREND_MONTHS = 6
+CACHE_TIMEOUT = 60 * 15
+
+
+def month_start(day, months_back=0):
+    """Return the first day of the month ``months_back`` months before ``day``."""
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def cache_key(user_id, version):
+    # Keyed by the data version, which every write moves on, so figures
+    # cached by any process are never read after a write from another
+    return f'expenses:dashboard-metrics:{user_id}:{version}'
+
+
+def compute_dashboard_metrics(user, today):
+    """
+    Compute every dashboard figure from one GROUP BY (category, month) query.
+
+    Reads the monthly spending rollups plus the daily rollups of the last
+    week. Months before the trend window fold into a single bucket, so the
+    row count stays bounded by the number of categories however long the
+    user's history gets.
+    """
+    trend_start = month_start(today, TREND_MONTHS - 1)
+    current_month = month_start(today)
+    week_ago = today - timedelta(days=7)
+
+    monthly_rows = Q(granularity=SpendingRollup.MONTH)
+    daily_rows = Q(granularity=SpendingRollup.DAY)
+    rows = (
+        SpendingRollup.objects.filter(user=user)
+        .filter(monthly_rows | (daily_rows & Q(period__gte=week_ago)))
+        .annotate(month=Case(
+            When(monthly_rows & Q(period__gte=trend_start), then=F('period')),
+            default=Value(None),
+            output_field=DateField(),
+        ))
+        .values('category__name', 'month')
+        .annotate(spent=Sum('total', filter=monthly_rows), week=Sum('total', filter=daily_rows))
+        .order_by()
+    )
+
+    months = [month_start(today, back) for back in range(TREND_MONTHS - 1, -1, -1)]
+    monthly = dict.fromkeys(months, Decimal('0'))
+    categories = {}
+    total = week = Decimal('0')
+    for row in rows:
+        amount = row['spent'] or Decimal('0')
+        total += amount
+        week += row['week'] or Decimal('0')
+        name = row['category__name'] or 'Uncategorized'
+        categories[name] = categories.get(name, Decimal('0')) + amount
+        if row['month'] in monthly:
+            monthly[row['month']] += amount
+
+    category_totals = sorted(categories.items(), key=lambda item: item[1], reverse=True)
+    month_total = monthly[current_month]
+    return {
+        'as_of': today,
+        'total_expenses': total,
+        'month_expenses': month_total,
+        'week_expenses': week,
+        'avg_daily': round(month_total / today.day, 2),
+        'category_data': {
+            'labels': [name for name, _ in category_totals],
+            'values': [float(value) for _, value in category_totals],
+        },
+        'monthly_data': {
+            'labels': [month.strftime('%b %Y') for month in months],
+            'values': [float(monthly[month]) for month in months],
+        },
+    }
+
+
+def get_dashboard_metrics(user, today=None, version=None):
+    """
+    Return the dashboard figures for ``user``, served from the cache while
+    their data ``version`` (read when not given) is unchanged.
+    """
+    if today is None:
+        today = timezone.now().date()
+    if version is None:
+        version = get_data_version(user).version
+
+    key = cache_key(user.pk, version)
+    metrics = cache.get(key)
+    if metrics is None or metrics['as_of'] != today:
+        metrics = compute_dashboard_metrics(user, today)
+        cache.set(key, metrics, CACHE_TIMEOUT)
+    return metrics
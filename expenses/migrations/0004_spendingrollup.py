@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:56
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_rollups(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    SpendingRollup = apps.get_model('expenses', 'SpendingRollup')
+    expenses = Expense.objects.filter(user__isnull=False)
+    for granularity, period in (('day', F('date')), ('month', TruncMonth('date'))):
+        grouped = (
+            expenses.annotate(rollup_period=period)
+            .values('user_id', 'category_id', 'rollup_period')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        SpendingRollup.objects.bulk_create([
+            SpendingRollup(
+                user_id=row['user_id'], category_id=row['category_id'], granularity=granularity,
+                period=row['rollup_period'], total=row['total'], count=row['count'],
+            )
+            for row in grouped.iterator()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_category_alter_budgetcap_category_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpendingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='spending_rollups', to='expenses.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spending_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'granularity', 'period'], name='rollup_user_period_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('user', 'category', 'granularity', 'period'), name='unique_category_rollup'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'granularity', 'period'), name='unique_uncategorized_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0006_dataversion_reportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='budgetcap',
+            name='start_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('warning', 'Warning'), ('exceeded', 'Exceeded')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('percent', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('seen_at', models.DateTimeField(blank=True, null=True)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='expenses.budgetcap')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'seen_at'], name='budgetalert_unseen_idx')],
+                'constraints': [models.UniqueConstraint(fields=('budget', 'period_start', 'level'), name='unique_budget_alert')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:56
+
+import django.db.models.deletion
+import expenses.search
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    expenses.search.install_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    expenses.search.drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_budgetalert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseSearchEntry',
+            fields=[
+                ('expense', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='expenses.expense')),
+                ('document', expenses.search.SearchDocumentField(db_column='expenses_expense_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'expenses_expense_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
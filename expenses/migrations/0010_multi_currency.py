@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:21
+
+import django.db.models.deletion
+import expenses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_recurring_expenses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetcap',
+            name='currency',
+            field=models.CharField(default=expenses.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(default=expenses.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='currency',
+            field=models.CharField(default=expenses.models.default_currency, max_length=3),
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), name='unique_exchange_rate')],
+            },
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='exchange_rate',
+            field=models.ForeignObject(from_fields=['currency', 'date'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='expenses.exchangerate', to_fields=['currency', 'date']),
+        ),
+    ]
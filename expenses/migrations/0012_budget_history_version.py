@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_report_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='history_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
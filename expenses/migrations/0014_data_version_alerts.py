@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0013_exchange_rate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='alerts_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
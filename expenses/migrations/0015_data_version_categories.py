@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0014_data_version_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='categories_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
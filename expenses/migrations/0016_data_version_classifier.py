@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0015_data_version_categories'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='classifier_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,9 +1,21 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from datetime import timedelta
 from decimal import Decimal
 
+from .search import FTS_TABLE, SearchDocumentField
+
+
+def default_currency():
+    return settings.BASE_CURRENCY
+
+
+def currency_field():
+    return models.CharField(max_length=3, default=default_currency)
+
+
 class Category(models.Model):
     DEFAULT_CATEGORIES = [
         ('Food', 'Food & Dining'),
@@ -33,17 +45,126 @@ class Expense(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenses', null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='expenses')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = currency_field()
     date = models.DateField(default=timezone.now)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # The rate of the expense's currency on its date, joined in SQL by
+    # expenses.currency.converted_amount(); there is no column behind it
+    exchange_rate = models.ForeignObject(
+        'ExchangeRate', on_delete=models.DO_NOTHING, from_fields=['currency', 'date'],
+        to_fields=['currency', 'date'], null=True, related_name='+',
+    )
+    # Set on the expenses a RecurringExpense made; one per rule and date
+    recurring = models.ForeignKey(
+        'RecurringExpense', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='expenses',
+    )
     
     class Meta:
         ordering = ['-date', '-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring', 'date'],
+                condition=models.Q(recurring__isnull=False),
+                name='unique_recurring_occurrence',
+            ),
+        ]
+        indexes = [
+            # Date range filters and keyset pagination over a user's expenses
+            models.Index(fields=['user', '-date', '-created_at', '-id'], name='expense_user_recent_idx'),
+            # Category filters combined with a date range (expense list, budgets)
+            models.Index(fields=['user', 'category', 'date'], name='expense_user_cat_date_idx'),
+        ]
     
     def __str__(self):
-        category_name = self.category.name if self.category else 'Uncategorized'
-        return f"{category_name} - ₹{self.amount} on {self.date}"
+        from .categories import category_names
+        from .currency import format_money
+        
+        if self.category_id is None:
+            category_name = 'Uncategorized'
+        elif Expense.category.is_cached(self):
+            category_name = self.category.name
+        else:
+            # Avoid a query per expense when the category was not selected
+            category_name = category_names(self.user_id).get(self.category_id, 'Uncategorized')
+        return f"{category_name} - {format_money(self.amount, self.currency)} on {self.date}"
+    
+    def save(self, *args, **kwargs):
+        from .alerts import refresh_budget_alerts
+        from .classifier import record_examples
+        from .rollups import record_expense_change
+        
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Expense.objects.select_for_update().filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            record_expense_change(previous, self)
+            record_examples(removed=[previous], added=[self])
+            if self.user_id is not None:
+                refresh_budget_alerts(self.user_id, [previous, self])
+
+
+class RecurringExpense(models.Model):
+    """A bill repeating on a schedule, turned into expenses by the materialize_recurring command."""
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    YEARLY = 'yearly'
+    FREQUENCY_CHOICES = [
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+        (YEARLY, 'Yearly'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_expenses')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_expenses')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = currency_field()
+    description = models.TextField()
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=MONTHLY)
+    start_date = models.DateField(default=timezone.localdate)
+    end_date = models.DateField(null=True, blank=True)
+    # First occurrence not turned into an expense yet; None once the schedule has ended
+    next_date = models.DateField(null=True, blank=True, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['next_date', 'pk']
+        indexes = [
+            models.Index(fields=['is_active', 'next_date'], name='recurring_due_idx'),
+        ]
+    
+    def __str__(self):
+        from .currency import format_money
+        
+        return f"{self.description} - {format_money(self.amount, self.currency)} {self.frequency}"
+    
+    def save(self, *args, **kwargs):
+        from .recurring import reschedule
+        
+        # Edits reschedule through RecurringExpenseForm, which knows what changed
+        if self._state.adding and self.next_date is None:
+            reschedule(self)
+        super().save(*args, **kwargs)
+
+
+class ExpenseSearchEntry(models.Model):
+    """Row of the SQLite full-text index over expense descriptions, kept up to date by triggers."""
+    expense = models.OneToOneField(
+        Expense, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_entry',
+    )
+    document = SearchDocumentField(db_column=FTS_TABLE)
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
 
 
 class BudgetCap(models.Model):
@@ -56,9 +177,10 @@ class BudgetCap(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budget_caps')
     name = models.CharField(max_length=100)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = currency_field()
     period = models.CharField(max_length=20, choices=PERIOD_CHOICES, default='monthly')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, blank=True, null=True, related_name='budget_caps')
-    start_date = models.DateField(default=timezone.now)
+    start_date = models.DateField(default=timezone.localdate)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -67,11 +189,14 @@ class BudgetCap(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
+        from .currency import format_money
+        
         category_text = f" ({self.category})" if self.category else " (All Categories)"
-        return f"{self.name} - ₹{self.amount}/{self.period}{category_text}"
+        return f"{self.name} - {format_money(self.amount, self.currency)}/{self.period}{category_text}"
     
-    def get_period_dates(self):
-        today = timezone.now().date()
+    def get_period_dates(self, today=None):
+        if today is None:
+            today = timezone.now().date()
         
         if today < self.start_date:
             return self.start_date, self.start_date
@@ -118,14 +243,16 @@ class BudgetCap(models.Model):
         return period_start, period_end
     
     def get_current_spending(self):
+        from .currency import converted_amount, from_base
+        
         period_start, period_end = self.get_period_dates()
         expenses = self.user.expenses.filter(date__gte=period_start, date__lte=period_end)
         
         if self.category:
             expenses = expenses.filter(category=self.category)
         
-        total = expenses.aggregate(models.Sum('amount'))['amount__sum'] or Decimal('0')
-        return total
+        total = expenses.aggregate(total=models.Sum(converted_amount()))['total'] or Decimal('0')
+        return from_base(total, self.currency, min(period_end, timezone.now().date()))
     
     @property
     def get_remaining(self):
@@ -146,3 +273,158 @@ class BudgetCap(models.Model):
         """Return positive amount over budget, or 0 if under"""
         remaining = self.get_remaining
         return abs(remaining) if remaining < 0 else 0
+
+
+class SpendingRollup(models.Model):
+    """Running spending total of a user per category and day or month."""
+    DAY = 'day'
+    MONTH = 'month'
+    GRANULARITY_CHOICES = [
+        (DAY, 'Day'),
+        (MONTH, 'Month'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spending_rollups')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='spending_rollups')
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'category', 'granularity', 'period'],
+                condition=models.Q(category__isnull=False),
+                name='unique_category_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'granularity', 'period'],
+                condition=models.Q(category__isnull=True),
+                name='unique_uncategorized_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'granularity', 'period'], name='rollup_user_period_idx'),
+        ]
+    
+    def __str__(self):
+        from .currency import format_money
+        
+        category_name = self.category.name if self.category else 'Uncategorized'
+        return f"{category_name} - {format_money(self.total)} ({self.granularity} of {self.period})"
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of ``currency`` in settings.BASE_CURRENCY on ``date``, loaded by load_exchange_rates."""
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    # Its latest value tells every process whether the rates it holds are current
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
+    
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate} {settings.BASE_CURRENCY}"
+
+
+class DataVersion(models.Model):
+    """Counter bumped on every write to a user's expense data."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='data_version')
+    version = models.PositiveBigIntegerField(default=0)
+    # Generation of the cached closed budget periods, moved on only by writes dated before today
+    history_version = models.PositiveBigIntegerField(default=0)
+    # Moved on when budget alerts are shown, which changes pages but no data
+    alerts_version = models.PositiveBigIntegerField(default=0)
+    # Generation of the cached category list, moved on by category changes
+    categories_version = models.PositiveBigIntegerField(default=0)
+    # Moved on by every change to what the category classifier learns from
+    classifier_version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user} - v{self.version}"
+
+
+class ReportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    filters = models.JSONField(default=dict, blank=True)
+    filter_key = models.CharField(max_length=40)
+    data_version = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = models.FileField(upload_to='reports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed while a worker renders; a running job without one for
+    # REPORT_JOB_TIMEOUT seconds has lost its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='reportjob_queue_idx'),
+            models.Index(fields=['user', 'filter_key', 'data_version'], name='reportjob_artifact_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Report for {self.user} ({self.status})"
+    
+    @property
+    def is_ready(self):
+        return self.status == self.DONE and bool(self.file)
+
+
+class BudgetAlert(models.Model):
+    """A budget crossing a threshold in one of its periods, kept until the user has seen it."""
+    WARNING = 'warning'
+    EXCEEDED = 'exceeded'
+    LEVEL_CHOICES = [
+        (WARNING, 'Warning'),
+        (EXCEEDED, 'Exceeded'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budget_alerts')
+    budget = models.ForeignKey(BudgetCap, on_delete=models.CASCADE, related_name='alerts')
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    percent = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    seen_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'period_start', 'level'], name='unique_budget_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'seen_at'], name='budgetalert_unseen_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.budget.name} {self.level} ({self.period_start})"
+    
+    @property
+    def message(self):
+        if self.level == self.EXCEEDED:
+            return f'Budget alert! You have exceeded: {self.budget.name}'
+        return f'You have reached {self.percent}% of your {self.budget.name} budget!'
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+KEYSET_ORDERING = ('-date', '-created_at', '-id')
+
+
+def get_page_size(value=None):
+    """Return the requested page size clamped to the configured bounds."""
+    default = getattr(settings, 'EXPENSE_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'EXPENSE_MAX_PAGE_SIZE', 200)
+    try:
+        size = int(value) if value else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def encode_cursor(row, ordering=KEYSET_ORDERING):
+    values = [_field(row, name.lstrip('-')) for name in ordering]
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _ordering_field(queryset, name):
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return queryset.query.annotations[name].output_field
+
+
+def decode_cursor(token, queryset, ordering=KEYSET_ORDERING):
+    """Return the position encoded in ``token`` as values of ``ordering``; raise ValueError if malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError
+        return tuple(
+            _ordering_field(queryset, name.lstrip('-')).to_python(value)
+            for name, value in zip(ordering, values)
+        )
+    except (TypeError, ValueError, UnicodeError, ValidationError) as exc:
+        raise ValueError(f'Invalid cursor: {token!r}') from exc
+
+
+def after_position(ordering, values):
+    """Filter for the rows that follow ``values`` in ``ordering``."""
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+    return condition
+
+
+def keyset_page(queryset, cursor=None, page_size=None, ordering=KEYSET_ORDERING):
+    """
+    Return ``(rows, next_cursor)`` for the page after ``cursor``.
+
+    Rows are ordered by ``ordering``, which must end in a unique field and
+    may name annotations, and the page is located with a WHERE clause on
+    that key instead of OFFSET, so deep pages cost the same as the first
+    one. ``next_cursor`` is None on the last page.
+    """
+    page_size = get_page_size(page_size)
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(after_position(ordering, decode_cursor(cursor, queryset, ordering)))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1], ordering)
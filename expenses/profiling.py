@@ -0,0 +1,242 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger('expenses.profiling')
+
+_active_profile = ContextVar('expenses_request_profile', default=None)
+_captures = []
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    view_name: str = None
+    status: int = None
+    wall_ms: float = 0.0
+    queries: int = 0
+    db_ms: float = 0.0
+    template_ms: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+
+    @property
+    def duplicates(self):
+        """Statement shapes run more than once, usually an N+1 loop."""
+        return {sql: count for sql, count in self.fingerprints.most_common() if count > 1}
+
+    @property
+    def query_budget(self):
+        return getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(self.view_name)
+
+    @property
+    def over_budget(self):
+        return self.query_budget is not None and self.queries > self.query_budget
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'wall_ms': round(self.wall_ms, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'template_ms': round(self.template_ms, 2),
+            'duplicates': self.duplicates,
+            'query_budget': self.query_budget,
+        }
+
+
+def fingerprint(sql):
+    """Reduce a statement to its shape: literals become ? and IN lists collapse."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _active_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_ms += (time.perf_counter() - started) * 1000
+        profile.queries += 1
+        profile.fingerprints[fingerprint(sql)] += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = _active_profile.get()
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_ms += (time.perf_counter() - started) * 1000
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds template render time to the active request profile."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name).template, self)
+
+
+class ViewStats:
+    """Running per-view totals of the profiles recorded by this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, profile):
+        with self._lock:
+            stats = self._views.setdefault(profile.view_name or 'unresolved', {
+                'requests': 0, 'wall_ms': 0.0, 'max_wall_ms': 0.0, 'queries': 0, 'max_queries': 0,
+                'db_ms': 0.0, 'template_ms': 0.0, 'over_budget': 0, 'duplicates': Counter(),
+            })
+            stats['requests'] += 1
+            stats['wall_ms'] += profile.wall_ms
+            stats['max_wall_ms'] = max(stats['max_wall_ms'], profile.wall_ms)
+            stats['queries'] += profile.queries
+            stats['max_queries'] = max(stats['max_queries'], profile.queries)
+            stats['db_ms'] += profile.db_ms
+            stats['template_ms'] += profile.template_ms
+            stats['over_budget'] += profile.over_budget
+            stats['duplicates'].update(profile.duplicates.keys())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    'requests': stats['requests'],
+                    'avg_wall_ms': round(stats['wall_ms'] / stats['requests'], 2),
+                    'max_wall_ms': round(stats['max_wall_ms'], 2),
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_ms': round(stats['db_ms'] / stats['requests'], 2),
+                    'avg_template_ms': round(stats['template_ms'] / stats['requests'], 2),
+                    'over_budget': stats['over_budget'],
+                    'duplicate_fingerprints': dict(stats['duplicates'].most_common(10)),
+                }
+                for name, stats in self._views.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+@contextmanager
+def capture_profiles():
+    """Collect the profile of every request handled inside the block, even with profiling off."""
+    profiles = []
+    _captures.append(profiles)
+    try:
+        yield profiles
+    finally:
+        _captures.remove(profiles)
+
+
+class ProfilingMiddleware:
+    """
+    Record wall time, query count, DB time, duplicate statements and template
+    time for each request, keyed by URL name.
+
+    Active when PROFILING_ENABLED is set or a capture_profiles() block is
+    open. Profiles are aggregated in ``view_stats`` and, with
+    PROFILING_ENABLED, logged as JSON to the ``expenses.profiling`` logger
+    (as warnings when a view exceeds its VIEW_QUERY_BUDGETS entry).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.is_active():
+            return self.get_response(request)
+        profile, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    async def __acall__(self, request):
+        if not self.is_active():
+            return await self.get_response(request)
+        profile, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        return self.finish(request, response, profile, started)
+
+    def is_active(self):
+        return bool(_captures) or getattr(settings, 'PROFILING_ENABLED', False)
+
+    def start(self, request):
+        profile = RequestProfile(method=request.method, path=request.path)
+        return profile, _active_profile.set(profile), time.perf_counter()
+
+    def finish(self, request, response, profile, started):
+        # Streaming bodies are produced after this point and are not included
+        profile.wall_ms = (time.perf_counter() - started) * 1000
+        profile.status = response.status_code
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            profile.view_name = match.view_name
+        for profiles in _captures:
+            profiles.append(profile)
+        view_stats.add(profile)
+        if getattr(settings, 'PROFILING_ENABLED', False):
+            level = logging.WARNING if profile.over_budget else logging.INFO
+            logger.log(level, json.dumps(profile.as_dict()))
+        return response
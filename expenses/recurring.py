@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .alerts import refresh_budget_alerts
+from .budgets import as_days, clamp_day
+from .classifier import record_examples
+from .models import Expense, RecurringExpense
+from .rollups import apply_deltas, expense_deltas
+from .versioning import bump_data_version
+
+
+STEP_DAYS = {RecurringExpense.DAILY: 1, RecurringExpense.WEEKLY: 7}
+STEP_MONTHS = {RecurringExpense.MONTHLY: 1, RecurringExpense.YEARLY: 12}
+# Every schedule repeats within this many days
+LONGEST_GAP = 366
+
+
+def occurrences(rule, since, until):
+    """
+    Dates of ``rule`` from ``since`` through ``until`` as a datetime64[D]
+    array. Monthly and yearly dates keep the start day, clamped to the
+    last day of shorter months (a rule starting on Jan 31 falls on Feb 28).
+    """
+    if rule.end_date is not None:
+        until = min(until, rule.end_date)
+    since = max(since, rule.start_date)
+    if until < since:
+        return np.array([], dtype='datetime64[D]')
+    start, first, last = as_days(rule.start_date), as_days(since), as_days(until)
+
+    if rule.frequency in STEP_DAYS:
+        step = STEP_DAYS[rule.frequency]
+        skipped = -(-(first - start).astype(np.int64) // step)
+        return np.arange(start + skipped * step, last + 1, np.timedelta64(step, 'D'))
+
+    step = STEP_MONTHS[rule.frequency]
+    start_month = start.astype('datetime64[M]')
+    day = (start - start_month.astype('datetime64[D]')).astype(np.int64)
+    lowest = (first.astype('datetime64[M]') - start_month).astype(np.int64) // step
+    highest = (last.astype('datetime64[M]') - start_month).astype(np.int64) // step
+    dates = clamp_day(start_month + np.arange(lowest, highest + 1) * step, day)
+    return dates[(dates >= first) & (dates <= last)]
+
+
+def first_occurrence(rule, since):
+    """The first date of ``rule`` on or after ``since``, or None once the schedule has ended."""
+    dates = occurrences(rule, since, since + timedelta(days=LONGEST_GAP))
+    return dates[0].item() if len(dates) else None
+
+
+def reschedule(rule, not_before=None):
+    """
+    Point ``rule.next_date`` at the first occurrence after the last
+    expense it made, so editing a schedule never repeats a date, and not
+    before ``not_before`` (a paused rule does not make up for the pause).
+    """
+    since = max(rule.start_date, not_before or rule.start_date)
+    if rule.pk is not None:
+        last = rule.expenses.aggregate(last=Max('date'))['last']
+        if last is not None:
+            since = max(since, last + timedelta(days=1))
+    rule.next_date = first_occurrence(rule, since) if rule.is_active else None
+
+
+def materialize_recurring(today=None, batch_size=500, rules=None):
+    """
+    Turn the occurrences of every active rule due by ``today`` into
+    expenses, for all users in one pass, ``batch_size`` rules per
+    transaction.
+
+    Expenses are inserted with bulk_create; a rule's ``next_date``, the
+    check against the dates it already made and the (rule, date) unique
+    constraint keep reruns from adding an occurrence twice. Like the
+    importer, the rollups are updated in bulk and each user's caches,
+    data version and budget alerts once per batch, however many
+    occurrences a long catch-up produces. Returns the number of expenses
+    created and of rules that were due. ``rules`` narrows the pass to a
+    queryset of rules.
+    """
+    if today is None:
+        today = timezone.localdate()
+    if rules is None:
+        rules = RecurringExpense.objects.all()
+    due = rules.filter(is_active=True, next_date__lte=today).order_by('pk')
+    created = rules_due = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(due.filter(pk__gt=last_pk).select_for_update()[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            rules_due += len(batch)
+            created += _materialize(batch, today)
+    return created, rules_due
+
+
+def _materialize(rules, today):
+    made = set(Expense.objects.filter(
+        recurring__in=rules, date__gte=min(rule.next_date for rule in rules),
+    ).values_list('recurring_id', 'date'))
+    expenses = []
+    for rule in rules:
+        for day in occurrences(rule, rule.next_date, today).tolist():
+            if (rule.pk, day) not in made:
+                expenses.append(Expense(
+                    user_id=rule.user_id, category_id=rule.category_id, amount=rule.amount, currency=rule.currency,
+                    description=rule.description, date=day, recurring=rule,
+                ))
+        rule.next_date = first_occurrence(rule, today + timedelta(days=1))
+
+    Expense.objects.bulk_create(expenses, batch_size=1000)
+    RecurringExpense.objects.bulk_update(rules, ['next_date'])
+    apply_deltas(expense_deltas(expenses))
+    record_examples(added=expenses)
+
+    # One stand-in per category and day is all the budget check needs
+    touched = {}
+    for expense in expenses:
+        touched.setdefault(expense.user_id, {})[(expense.category_id, expense.date)] = expense
+    for user_id, covered in touched.items():
+        bump_data_version(user_id)
+        refresh_budget_alerts(user_id, list(covered.values()), today=today)
+    return len(expenses)
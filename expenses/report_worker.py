@@ -0,0 +1,12 @@
+# Entry points for report worker processes. This module must stay importable
+# before django.setup(), since spawned workers unpickle references to it first.
+import django
+
+
+def init_worker():
+    django.setup()
+
+
+def run_job(job_id):
+    from .reports import render_report
+    return render_report(job_id)
@@ -0,0 +1,224 @@
+import hashlib
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, TableStyle
+
+from .currency import CENT, converted_amount, format_money
+from .filters import clean_filters, filter_expenses
+from .models import Expense, ReportJob
+from .versioning import get_data_version
+
+
+HEADER = ['Date', 'Category', 'Amount', 'Description']
+
+HEADER_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+]
+
+COLUMN_WIDTHS = [80, 110, 90, 250]
+
+
+def make_filter_key(filters):
+    return hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+
+
+def request_report(user, params):
+    """
+    Return the report job for ``user`` and the expense list filters in ``params``.
+
+    A finished or queued job for the same filters and data version is
+    reused, so unchanged data is never rendered twice.
+    """
+    filters = clean_filters(params)
+    filter_key = make_filter_key(filters)
+    data_version = get_data_version(user).version
+    job = ReportJob.objects.filter(
+        user=user, filter_key=filter_key, data_version=data_version,
+    ).exclude(status=ReportJob.FAILED).first()
+    if job is None:
+        job = ReportJob.objects.create(
+            user=user, filters=filters, filter_key=filter_key, data_version=data_version,
+        )
+    return job
+
+
+def report_etag(request, pk):
+    """ETag of a finished report; its artifact never changes once written."""
+    job = ReportJob.objects.filter(pk=pk, user=request.user, status=ReportJob.DONE).values('data_version').first()
+    return f'report-{pk}-{job["data_version"]}' if job else None
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None if the queue is empty."""
+    while True:
+        job = ReportJob.objects.filter(status=ReportJob.PENDING).order_by('created_at').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(pk=job.pk, status=ReportJob.PENDING).update(
+            status=ReportJob.RUNNING, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs():
+    """
+    Put running jobs without a heartbeat for REPORT_JOB_TIMEOUT seconds
+    back in the queue, and fail those already claimed REPORT_MAX_ATTEMPTS
+    times, so a report that keeps crashing its worker is not retried
+    forever. Returns the number of jobs requeued.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'REPORT_JOB_TIMEOUT', 600))
+    stale = ReportJob.objects.filter(status=ReportJob.RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+    )
+    max_attempts = getattr(settings, 'REPORT_MAX_ATTEMPTS', 3)
+    stale.filter(attempts__gte=max_attempts).update(
+        status=ReportJob.FAILED, finished_at=now,
+        error=f'The worker stopped responding {max_attempts} times.',
+    )
+    return stale.filter(attempts__lt=max_attempts).update(
+        status=ReportJob.PENDING, started_at=None, heartbeat_at=None,
+    )
+
+
+class ReportJobLost(Exception):
+    """The job was requeued or failed while this worker was rendering it."""
+
+
+def _no_heartbeat(*args):
+    pass
+
+
+def _heartbeat(job):
+    """Return a callable refreshing ``job``'s heartbeat at most every REPORT_HEARTBEAT_INTERVAL seconds."""
+    interval = timedelta(seconds=getattr(settings, 'REPORT_HEARTBEAT_INTERVAL', 30))
+    last = [timezone.now()]
+
+    def beat(*args):
+        now = timezone.now()
+        if now - last[0] < interval:
+            return
+        last[0] = now
+        alive = ReportJob.objects.filter(pk=job.pk, status=ReportJob.RUNNING, attempts=job.attempts).update(
+            heartbeat_at=now,
+        )
+        if not alive:
+            raise ReportJobLost(job.pk)
+    return beat
+
+
+def _segment_style(include_total):
+    style = list(HEADER_STYLE)
+    if include_total:
+        style.append(('BACKGROUND', (0, -1), (-1, -1), colors.beige))
+    return TableStyle(style)
+
+
+def build_report_pdf(user, filters, chunk_rows=None, heartbeat=None):
+    """
+    Render the expense report of ``user`` as PDF bytes.
+
+    Rows are streamed from the database and laid out in LongTable segments
+    of ``chunk_rows`` rows, which keeps reportlab's table splitting cheap
+    for reports with many thousands of rows. ``heartbeat`` is called after
+    every segment and page.
+    """
+    if heartbeat is None:
+        heartbeat = _no_heartbeat
+    if chunk_rows is None:
+        chunk_rows = getattr(settings, 'REPORT_CHUNK_ROWS', 500)
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"<b>ExpenseMate - Expense Report for {user.username}</b>", styles['Title']),
+        Spacer(1, 12),
+    ]
+
+    rows = filter_expenses(Expense.objects.filter(user=user), filters, user).order_by(
+        '-date', '-created_at', '-id',
+    ).values_list(
+        'date', Coalesce('category__name', Value('Uncategorized')), 'amount', 'currency', converted_amount(),
+        'description',
+    )
+
+    # The base fonts have no rupee sign, so amounts carry their currency code
+    total = Decimal('0')
+    segment = [HEADER]
+    for day, category_name, amount, currency, converted, description in rows.iterator(chunk_size=chunk_rows):
+        segment.append([
+            day.strftime('%Y-%m-%d'), category_name, format_money(amount, currency, plain=True), description[:50],
+        ])
+        total += converted or Decimal('0')
+        if len(segment) > chunk_rows:
+            elements.append(LongTable(segment, colWidths=COLUMN_WIDTHS, repeatRows=1, style=_segment_style(False)))
+            segment = [HEADER]
+            heartbeat()
+    segment.append(['', '', format_money(total.quantize(CENT), plain=True), 'TOTAL'])
+    elements.append(LongTable(segment, colWidths=COLUMN_WIDTHS, repeatRows=1, style=_segment_style(True)))
+
+    doc.build(elements, onFirstPage=heartbeat, onLaterPages=heartbeat)
+    return buffer.getvalue()
+
+
+def render_report(job_id):
+    """Render a claimed job and store its artifact. Runs inside a report worker process."""
+    job = ReportJob.objects.select_related('user').get(pk=job_id)
+    try:
+        content = build_report_pdf(job.user, job.filters, heartbeat=_heartbeat(job))
+    except ReportJobLost:
+        # Another worker owns the job now, or it was given up on
+        return 'lost'
+    except Exception as e:
+        job.status = ReportJob.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job.status
+
+    name = f'{job.user_id}-{job.filter_key[:12]}-v{job.data_version}.pdf'
+    job.file.save(name, ContentFile(content), save=False)
+    # Only the worker holding the latest claim may finish the job
+    finished = ReportJob.objects.filter(pk=job.pk, status=ReportJob.RUNNING, attempts=job.attempts).update(
+        file=job.file.name, status=ReportJob.DONE, finished_at=timezone.now(),
+    )
+    if not finished:
+        job.file.delete(save=False)
+        return 'lost'
+    job.status = ReportJob.DONE
+    discard_superseded_reports(job)
+    return job.status
+
+
+def discard_superseded_reports(job):
+    """Delete artifacts of the same user and filters rendered from older data."""
+    superseded = ReportJob.objects.filter(
+        user_id=job.user_id, filter_key=job.filter_key, data_version__lt=job.data_version,
+    ).exclude(status__in=[ReportJob.PENDING, ReportJob.RUNNING])
+    for old in superseded:
+        if old.file:
+            old.file.delete(save=False)
+    with transaction.atomic():
+        superseded.delete()
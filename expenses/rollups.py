@@ -0,0 +1,236 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .budgets import invalidate_budget_history
+from .currency import base_currency, converted_amount, rates, to_base
+from .models import Expense, SpendingRollup
+from .versioning import bump_data_version
+
+
+_date_field = Expense._meta.get_field('date')
+_amount_field = Expense._meta.get_field('amount')
+
+# Batches with more rows than this take the bulk path of apply_deltas
+BULK_DELTAS = 16
+PERIOD_CHUNK = 500
+
+
+def rollup_periods(day):
+    return ((SpendingRollup.DAY, day), (SpendingRollup.MONTH, day.replace(day=1)))
+
+
+def _add_expense(deltas, expense, sign, known=None):
+    if expense is None or expense.user_id is None:
+        return
+    day = _date_field.to_python(expense.date)
+    # Rollups are kept in the base currency; without a rate the amount
+    # counts as nothing, as in the SQL sum of expected_rollups()
+    amount = to_base(_amount_field.to_python(expense.amount), expense.currency, day, known)
+    amount = (amount or Decimal('0')) * sign
+    for granularity, period in rollup_periods(day):
+        key = (expense.user_id, expense.category_id, granularity, period)
+        total, count = deltas.get(key, (Decimal('0'), 0))
+        deltas[key] = (total + amount, count + sign)
+
+
+def _apply_row(user_id, category_id, granularity, period, amount, count):
+    rows = SpendingRollup.objects.filter(
+        user_id=user_id, category_id=category_id, granularity=granularity, period=period,
+    )
+    changes = {'total': F('total') + amount, 'count': F('count') + count}
+    if rows.update(**changes):
+        if count < 0:
+            rows.filter(count=0).delete()
+        return
+    if count < 0:
+        # Nothing to subtract from; verify_rollups reports the drift.
+        return
+    try:
+        with transaction.atomic():
+            SpendingRollup.objects.create(
+                user_id=user_id, category_id=category_id, granularity=granularity,
+                period=period, total=amount, count=count,
+            )
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def _apply_bulk(deltas):
+    """
+    Apply many deltas with a few queries: increment the rows that exist in
+    one executemany and bulk insert the rest.
+    """
+    periods = {}
+    for user_id, _, granularity, period in deltas:
+        periods.setdefault((user_id, granularity), set()).add(period)
+    existing = {}
+    for (user_id, granularity), days in periods.items():
+        days = sorted(days)
+        for index in range(0, len(days), PERIOD_CHUNK):
+            # Locked so a concurrent delete of an emptied row cannot swallow an increment
+            rows = SpendingRollup.objects.select_for_update().filter(
+                user_id=user_id, granularity=granularity, period__in=days[index:index + PERIOD_CHUNK],
+            ).values_list('pk', 'category_id', 'period')
+            for pk, category_id, period in rows:
+                existing[(user_id, category_id, granularity, period)] = pk
+
+    increments, emptied, missing = [], [], []
+    for key, (amount, count) in deltas.items():
+        pk = existing.get(key)
+        if pk is not None:
+            increments.append((str(amount), count, pk))
+            if count < 0:
+                emptied.append(pk)
+        elif count >= 0:
+            user_id, category_id, granularity, period = key
+            missing.append(SpendingRollup(
+                user_id=user_id, category_id=category_id, granularity=granularity,
+                period=period, total=amount, count=count,
+            ))
+
+    connection = connections[router.db_for_write(SpendingRollup)]
+    table, pk, total, count = (
+        connection.ops.quote_name(name)
+        for name in (SpendingRollup._meta.db_table, SpendingRollup._meta.pk.column, 'total', 'count')
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET {total} = {total} + CAST(%s AS NUMERIC), {count} = {count} + %s WHERE {pk} = %s',
+            increments,
+        )
+    if emptied:
+        SpendingRollup.objects.filter(pk__in=emptied, count=0).delete()
+    try:
+        with transaction.atomic():
+            SpendingRollup.objects.bulk_create(missing, batch_size=1000)
+    except IntegrityError:
+        # A concurrent writer created some of them first
+        for row in missing:
+            _apply_row(row.user_id, row.category_id, row.granularity, row.period, row.total, row.count)
+
+
+def apply_deltas(deltas):
+    """Apply ``{(user_id, category_id, granularity, period): (amount, count)}``."""
+    today = timezone.now().date()
+    deltas = {key: change for key, change in deltas.items() if change[0] or change[1]}
+    with transaction.atomic():
+        if len(deltas) > BULK_DELTAS:
+            _apply_bulk(deltas)
+        else:
+            for key, (amount, count) in deltas.items():
+                _apply_row(*key, amount, count)
+    # Only days before today can belong to a closed budget period
+    backdated = {key[0] for key in deltas if key[2] == SpendingRollup.DAY and key[3] < today}
+    for user_id in backdated:
+        invalidate_budget_history(user_id)
+
+
+def expense_deltas(expenses, sign=1, deltas=None):
+    """Accumulate the rollup deltas of ``expenses`` into ``deltas`` and return it."""
+    if deltas is None:
+        deltas = {}
+    expenses = [expense for expense in expenses if expense is not None and expense.user_id is not None]
+    known = rates(
+        (expense.currency, _date_field.to_python(expense.date))
+        for expense in expenses if expense.currency != base_currency()
+    )
+    for expense in expenses:
+        _add_expense(deltas, expense, sign, known)
+    return deltas
+
+
+def apply_expenses(expenses, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) a batch of expenses from the rollups."""
+    apply_deltas(expense_deltas(expenses, sign))
+
+
+def record_expense_change(previous, expense):
+    """Move ``expense`` from its ``previous`` saved state to its current one."""
+    deltas = {}
+    _add_expense(deltas, previous, -1)
+    _add_expense(deltas, expense, 1)
+    apply_deltas(deltas)
+
+
+def fold_category(category):
+    """Move a category's rollups to Uncategorized, mirroring Expense.category SET_NULL."""
+    rows = SpendingRollup.objects.filter(category=category)
+    deltas = {
+        (row.user_id, None, row.granularity, row.period): (row.total, row.count)
+        for row in rows
+    }
+    with transaction.atomic():
+        apply_deltas(deltas)
+        rows.delete()
+
+
+def expected_rollups(user=None):
+    """Yield ``(key, total, count)`` for every rollup row computed from the expenses."""
+    expenses = Expense.objects.filter(user__isnull=False)
+    if user is not None:
+        expenses = expenses.filter(user=user)
+    for granularity, period in ((SpendingRollup.DAY, F('date')), (SpendingRollup.MONTH, TruncMonth('date'))):
+        grouped = (
+            expenses.annotate(rollup_period=period)
+            .values('user_id', 'category_id', 'rollup_period')
+            .annotate(total=Sum(converted_amount()), count=Count('id'))
+            .order_by()
+        )
+        for row in grouped.iterator():
+            key = (row['user_id'], row['category_id'], granularity, row['rollup_period'])
+            yield key, row['total'] or Decimal('0'), row['count']
+
+
+def rebuild_rollups(user=None, batch_size=1000):
+    """
+    Replace the rollups of ``user`` (or everybody) with freshly computed
+    rows, and move the rebuilt users' data version and caches on.
+    """
+    existing = SpendingRollup.objects.all()
+    if user is not None:
+        existing = existing.filter(user=user)
+    created = 0
+    with transaction.atomic():
+        users = set(existing.values_list('user_id', flat=True).distinct())
+        existing.delete()
+        batch = []
+        for (user_id, category_id, granularity, period), total, count in expected_rollups(user):
+            users.add(user_id)
+            batch.append(SpendingRollup(
+                user_id=user_id, category_id=category_id, granularity=granularity,
+                period=period, total=total, count=count,
+            ))
+            if len(batch) >= batch_size:
+                SpendingRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        SpendingRollup.objects.bulk_create(batch)
+        created += len(batch)
+        # Any total may have moved, so pages and figures cached before must go
+        for user_id in users:
+            bump_data_version(user_id)
+            invalidate_budget_history(user_id)
+    return created
+
+
+def verify_rollups(user=None):
+    """Return ``(key, expected, actual)`` for every rollup row that has drifted."""
+    existing = SpendingRollup.objects.all()
+    if user is not None:
+        existing = existing.filter(user=user)
+    actual = {
+        (row.user_id, row.category_id, row.granularity, row.period): (row.total, row.count)
+        for row in existing.iterator()
+    }
+    mismatches = []
+    for key, total, count in expected_rollups(user):
+        found = actual.pop(key, None)
+        if found != (total, count):
+            mismatches.append((key, (total, count), found))
+    for key, found in actual.items():
+        mismatches.append((key, None, found))
+    return mismatches
@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+PIN_SESSION_KEY = 'replica_pinned_until'
+
+# True while a replica_reads view runs for a session that may read stale data
+_use_replica = ContextVar('expenses_use_replica', default=False)
+# Per-request record of whether anything was written, set up by the middleware
+_request_writes = ContextVar('expenses_request_writes', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'DATABASE_REPLICA', None)
+
+
+def pinned_to_primary(request):
+    """True when the session wrote recently enough that the replica may not have caught up."""
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+@contextmanager
+def reading_from_replica(request=None):
+    """Route reads inside the block to the replica, unless ``request``'s session is pinned."""
+    token = _use_replica.set(replica_alias() is not None and not pinned_to_primary(request))
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    """
+    Let a read-heavy view that tolerates slight staleness read from the replica.
+
+    Reads go back to the primary once the request writes anything, and for
+    the whole request when the session wrote within REPLICA_PIN_SECONDS.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with reading_from_replica(request):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with reading_from_replica(request):
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send reads of replica_reads views to DATABASE_REPLICA and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        writes = _request_writes.get()
+        if _use_replica.get() and not (writes and writes['wrote']):
+            return replica_alias()
+        # Explicit, so objects loaded from the replica do not pull related reads there
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        writes = _request_writes.get()
+        if writes is not None:
+            writes['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track writes per request and pin the session to the primary after one.
+
+    Must come after SessionMiddleware. Only pins when a replica is configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        writes = {'wrote': False}
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        self.pin(request, writes)
+        return response
+
+    async def __acall__(self, request):
+        writes = {'wrote': False}
+        token = _request_writes.set(writes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        self.pin(request, writes)
+        return response
+
+    def pin(self, request, writes):
+        if writes['wrote'] and replica_alias() is not None and hasattr(request, 'session'):
+            request.session[PIN_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_PIN_SECONDS', 15)
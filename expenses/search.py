@@ -0,0 +1,158 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Func, Lookup, TextField, Value
+
+
+SEARCH_CONFIG = 'english'
+# Most relevant first; the id breaks ties so keyset pagination works on it
+SEARCH_ORDERING = ('-search_rank', '-id')
+MAX_SEARCH_WORDS = 8
+
+# SQLite: an FTS5 table over expenses_expense (external content, so the
+# descriptions are not stored twice). The owner is indexed next to the
+# description so a user's search only walks that user's postings.
+FTS_TABLE = 'expenses_expense_fts'
+_FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"description, user_id, content='expenses_expense', content_rowid='id', "
+    f"tokenize='porter unicode61 remove_diacritics 2')"
+)
+# Triggers keep the index in step with every write, bulk_create and
+# queryset.update() included
+_FTS_TRIGGERS = {
+    f'{FTS_TABLE}_insert': f"""
+        AFTER INSERT ON expenses_expense BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, description, user_id)
+            VALUES (new.id, new.description, new.user_id);
+        END""",
+    f'{FTS_TABLE}_delete': f"""
+        AFTER DELETE ON expenses_expense BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, user_id)
+            VALUES ('delete', old.id, old.description, old.user_id);
+        END""",
+    f'{FTS_TABLE}_update': f"""
+        AFTER UPDATE OF description, user_id ON expenses_expense BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, user_id)
+            VALUES ('delete', old.id, old.description, old.user_id);
+            INSERT INTO {FTS_TABLE}(rowid, description, user_id)
+            VALUES (new.id, new.description, new.user_id);
+        END""",
+}
+
+# PostgreSQL: a GIN index on the same expression TextMatch filters on
+POSTGRES_INDEX = 'expense_description_search_idx'
+
+
+def install_search_index(connection):
+    """
+    Create the full-text index of expense descriptions where it is missing.
+
+    SQLite drops the triggers whenever a migration rebuilds the expense
+    table, so this runs after every migrate and rebuilds the index from
+    the table when anything had to be recreated.
+    """
+    table_names = connection.introspection.table_names()
+    if 'expenses_expense' not in table_names:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {POSTGRES_INDEX} ON expenses_expense "
+                f"USING GIN (to_tsvector('{SEARCH_CONFIG}', description))"
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'expenses_expense'")
+            existing = {row[0] for row in cursor.fetchall()}
+            missing = [name for name in _FTS_TRIGGERS if name not in existing]
+            if not missing and FTS_TABLE in table_names:
+                return
+            cursor.execute(_FTS_SCHEMA)
+            for name in missing:
+                cursor.execute(f'CREATE TRIGGER {name} {_FTS_TRIGGERS[name]}')
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {POSTGRES_INDEX}')
+        elif connection.vendor == 'sqlite':
+            for name in _FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class SearchDocumentField(TextField):
+    """The hidden column named after an FTS5 table, which MATCH is run against."""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class TextSearch(Func):
+    def __init__(self, expression, query, **extra):
+        super().__init__(expression, Value(query), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        (document, params), (query, query_params) = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        sql = self.template % {'config': SEARCH_CONFIG, 'document': document, 'query': query}
+        return sql, (*params, *query_params)
+
+
+class TextMatch(TextSearch):
+    """PostgreSQL full-text match in the shape the GIN expression index serves."""
+    template = "to_tsvector('%(config)s', %(document)s) @@ websearch_to_tsquery('%(config)s', %(query)s)"
+    output_field = BooleanField()
+
+
+class TextRank(TextSearch):
+    template = "ts_rank(to_tsvector('%(config)s', %(document)s), websearch_to_tsquery('%(config)s', %(query)s))"
+    output_field = FloatField()
+
+
+def search_words(text):
+    return re.findall(r'\w+', text or '')[:MAX_SEARCH_WORDS]
+
+
+def fts_query(words, user_id=None):
+    """FTS5 query for all of ``words``; quoting keeps user input from being read as query syntax."""
+    terms = [f'description : "{word}"' for word in words]
+    if user_id is not None:
+        terms.insert(0, f'user_id : "{int(user_id)}"')
+    return ' AND '.join(terms)
+
+
+def search_expenses(expenses, text, user=None):
+    """
+    Narrow ``expenses`` to those whose description contains every word of
+    ``text``, stemmed, and annotate ``search_rank`` (higher is better).
+
+    Passing the ``user`` the expenses belong to lets SQLite search only
+    that user's part of the index. Backends without a full-text index
+    fall back to icontains and rank every match equally.
+    """
+    words = search_words(text)
+    if not words:
+        return expenses
+    vendor = connections[expenses.db].vendor
+    if vendor == 'sqlite':
+        return expenses.filter(
+            search_entry__document__match=fts_query(words, getattr(user, 'pk', user)),
+        ).annotate(search_rank=-F('search_entry__rank'))
+    if vendor == 'postgresql':
+        return expenses.filter(TextMatch('description', text)).annotate(
+            search_rank=TextRank('description', text),
+        )
+    for word in words:
+        expenses = expenses.filter(description__icontains=word)
+    return expenses.annotate(search_rank=Value(0.0, output_field=FloatField()))
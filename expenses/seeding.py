@@ -0,0 +1,123 @@
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .categories import invalidate_categories
+from .models import BudgetCap, Category, Expense
+from .rollups import rebuild_rollups
+
+
+# Category name and typical (median) amount of a single expense
+CATEGORY_PROFILES = [
+    ('Groceries', 450), ('Dining', 600), ('Transport', 150), ('Utilities', 1800),
+    ('Rent', 15000), ('Shopping', 1200), ('Entertainment', 500), ('Health', 900),
+    ('Subscriptions', 300), ('Travel', 4000), ('Education', 2500), ('Insurance', 3000),
+]
+UNCATEGORIZED_MEDIAN = 250
+UNCATEGORIZED_SHARE = 0.1
+WEEKEND_WEIGHT = 1.5
+PERIOD_MONTHS = {'weekly': 12 / 52, 'monthly': 1, 'yearly': 12}
+MAX_BUDGET = 99_999_999
+
+
+def _category_profiles(count):
+    profiles = []
+    for index in range(count):
+        name, median = CATEGORY_PROFILES[index % len(CATEGORY_PROFILES)]
+        if index >= len(CATEGORY_PROFILES):
+            name = f'{name} {index // len(CATEGORY_PROFILES) + 1}'
+        profiles.append((name, median))
+    return profiles
+
+
+def _random_day(rng, today, days):
+    # Weekend days are WEEKEND_WEIGHT times as likely as weekdays
+    while True:
+        day = today - timedelta(days=rng.randrange(days))
+        if day.weekday() >= 5 or rng.random() * WEEKEND_WEIGHT < 1:
+            return day
+
+
+def _amount(rng, median):
+    value = rng.lognormvariate(math.log(median), 0.6)
+    return Decimal(max(value, 1)).quantize(Decimal('0.01'))
+
+
+def seed_synthetic_data(users=10, expenses_per_user=1000, years=2, categories=8, budgets=4,
+                        prefix='demo', password='demo-pass-123', seed=42, today=None, batch_size=2000):
+    """
+    Create users with synthetic categories, expenses and budgets.
+
+    Categories are used with Zipf-like frequencies, amounts follow a
+    log-normal distribution around a per-category median and weekends see
+    more spending. Everything is inserted with bulk_create and the rollups
+    of the new users are rebuilt afterwards. Returns the created users.
+    """
+    rng = random.Random(seed)
+    if today is None:
+        today = timezone.now().date()
+    days = max(years * 365, 1)
+    profiles = _category_profiles(categories)
+    weights = [1 / (rank + 1) for rank in range(len(profiles))]
+    hashed = make_password(password)
+
+    with transaction.atomic():
+        owners = User.objects.bulk_create([
+            User(username=f'{prefix}{index}', password=hashed) for index in range(users)
+        ])
+        # Backends that cannot return primary keys from bulk_create need a refetch
+        if any(owner.pk is None for owner in owners):
+            owners = list(User.objects.filter(username__in=[owner.username for owner in owners]).order_by('pk'))
+
+        for owner in owners:
+            owned = Category.objects.bulk_create([Category(user=owner, name=name) for name, _ in profiles])
+            invalidate_categories(owner.pk)
+            medians = [median for _, median in profiles]
+
+            batch = []
+            for _ in range(expenses_per_user):
+                if owned and rng.random() >= UNCATEGORIZED_SHARE:
+                    index = rng.choices(range(len(owned)), weights)[0]
+                    category, median = owned[index], medians[index]
+                else:
+                    category, median = None, UNCATEGORIZED_MEDIAN
+                batch.append(Expense(
+                    user=owner, category=category, amount=_amount(rng, median),
+                    date=_random_day(rng, today, days), description=f'Synthetic {category or "expense"}',
+                ))
+                if len(batch) >= batch_size:
+                    Expense.objects.bulk_create(batch)
+                    batch = []
+            Expense.objects.bulk_create(batch)
+
+            # Budgets sit around the expected spend of their period
+            per_month = expenses_per_user / (days / 30)
+            monthly_spend = [
+                per_month * (1 - UNCATEGORIZED_SHARE) * weight / sum(weights) * median
+                for weight, median in zip(weights, medians)
+            ]
+            caps = []
+            for index in range(budgets):
+                if index == 0 or not owned:
+                    category, period = None, 'monthly'
+                    spend = sum(monthly_spend) + per_month * UNCATEGORIZED_SHARE * UNCATEGORIZED_MEDIAN
+                else:
+                    category = owned[(index - 1) % len(owned)]
+                    period = rng.choice(['weekly', 'monthly', 'monthly', 'yearly'])
+                    spend = monthly_spend[(index - 1) % len(owned)]
+                amount = min(max(spend * PERIOD_MONTHS[period] * rng.uniform(0.8, 1.3), 100), MAX_BUDGET)
+                caps.append(BudgetCap(
+                    user=owner, category=category, period=period, start_date=today - timedelta(days=days),
+                    name=f'{category.name if category else "Overall"} {period} budget',
+                    amount=Decimal(amount).quantize(Decimal('0.01')),
+                ))
+            BudgetCap.objects.bulk_create(caps)
+
+            rebuild_rollups(owner)
+    return owners
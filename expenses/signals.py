@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from .alerts import refresh_budget_alerts
+from .categories import invalidate_categories
+from .classifier import forget_category, record_examples
+from .models import BudgetCap, Category, Expense
+from .rollups import apply_expenses, fold_category
+from .search import install_search_index
+from .versioning import bump_data_version
+
+
+@receiver(post_delete, sender=Expense)
+def expense_deleted(sender, instance, **kwargs):
+    # post_delete runs inside the deletion transaction; saves are handled by Expense.save()
+    apply_expenses([instance], sign=-1)
+    record_examples(removed=[instance])
+    if instance.user_id is not None:
+        refresh_budget_alerts(instance.user_id, [instance])
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def expense_changed(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=BudgetCap)
+def budget_saved(sender, instance, **kwargs):
+    # A new or changed limit can cross a threshold without any expense write
+    if instance.is_active:
+        refresh_budget_alerts(instance.user_id, budgets=[instance])
+    else:
+        instance.alerts.filter(seen_at__isnull=True).delete()
+
+
+@receiver(post_save, sender=BudgetCap)
+@receiver(post_delete, sender=BudgetCap)
+def budget_changed(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # Expenses of a deleted category become uncategorized through SET_NULL
+    fold_category(instance)
+    forget_category(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Renames and deletes change the labels of the category breakdown
+    invalidate_categories(instance.user_id)
+    bump_data_version(instance.user_id)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    # WAL lets readers run next to a writer; the pragmas are per connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    # Rebuilding the expense table in a SQLite migration drops the search triggers
+    if sender.label == 'expenses':
+        install_search_index(connections[using])
@@ -0,0 +1,18 @@
+from django import template
+
+from ..currency import format_money
+
+
+register = template.Library()
+
+
+@register.filter
+def money(amount, currency=None):
+    """``{{ expense.amount|money:expense.currency }}``; without a currency the amount is in the base one"""
+    return format_money(amount, currency)
+
+
+@register.simple_tag
+def currency_symbol():
+    """Prefix of base currency amounts, for scripts that format them"""
+    return format_money('')
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
@@ -15,7 +15,9 @@ urlpatterns = [
     path('categories/delete/<int:pk>/', views.category_delete, name='category_delete'),
     
     path('expenses/', views.expense_list, name='expense_list'),
+    path('expenses/page/', views.expense_list_page, name='expense_list_page'),
     path('expenses/add/', views.expense_add, name='expense_add'),
+    path('expenses/import/', views.expense_import, name='expense_import'),
     path('expenses/edit/<int:pk>/', views.expense_edit, name='expense_edit'),
     path('expenses/delete/<int:pk>/', views.expense_delete, name='expense_delete'),
     
@@ -23,8 +25,30 @@ urlpatterns = [
     path('budgets/add/', views.budget_add, name='budget_add'),
     path('budgets/edit/<int:pk>/', views.budget_edit, name='budget_edit'),
     path('budgets/delete/<int:pk>/', views.budget_delete, name='budget_delete'),
+    path('budgets/<int:pk>/history/', views.budget_history, name='budget_history'),
+    
+    path('recurring/', views.recurring_list, name='recurring_list'),
+    path('recurring/add/', views.recurring_add, name='recurring_add'),
+    path('recurring/edit/<int:pk>/', views.recurring_edit, name='recurring_edit'),
+    path('recurring/delete/<int:pk>/', views.recurring_delete, name='recurring_delete'),
     
     path('export/csv/', views.export_csv, name='export_csv'),
     path('export/pdf/', views.export_pdf, name='export_pdf'),
+    path('export/pdf/<int:pk>/status/', views.report_status, name='report_status'),
+    path('export/pdf/<int:pk>/download/', views.report_download, name='report_download'),
     path('ai-predictions/', views.ai_predictions, name='ai_predictions'),
+    path('ai-predictions/stream/', views.ai_predictions_stream, name='ai_predictions_stream'),
+    path('metrics/', views.profiling_metrics, name='profiling_metrics'),
+    
+    path('api/v1/expenses/', api.collection, {'resource': api.expenses}, name='api_expenses'),
+    path('api/v1/expenses/batch/', api.batch, {'resource': api.expenses}, name='api_expense_batch'),
+    path('api/v1/expenses/<int:pk>/', api.detail, {'resource': api.expenses}, name='api_expense'),
+    path('api/v1/categories/', api.collection, {'resource': api.categories}, name='api_categories'),
+    path('api/v1/categories/suggest/', api.suggest_category, name='api_category_suggest'),
+    path('api/v1/categories/batch/', api.batch, {'resource': api.categories}, name='api_category_batch'),
+    path('api/v1/categories/<int:pk>/', api.detail, {'resource': api.categories}, name='api_category'),
+    path('api/v1/budgets/', api.collection, {'resource': api.budgets}, name='api_budgets'),
+    path('api/v1/budgets/batch/', api.batch, {'resource': api.budgets}, name='api_budget_batch'),
+    path('api/v1/budgets/<int:pk>/', api.detail, {'resource': api.budgets}, name='api_budget'),
+    path('api/v1/analytics/', api.analytics, name='api_analytics'),
 ]
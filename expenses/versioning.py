@@ -0,0 +1,130 @@
+from datetime import datetime, time
+from functools import wraps
+from hashlib import sha256
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import DataVersion
+
+
+def bump_data_version(user_id):
+    """
+    Mark the data of ``user_id`` as changed.
+
+    The counter row is created by the first write, at version 1; readers
+    treat a missing row as version 0.
+    """
+    if user_id is not None:
+        _increment(user_id, 'version', updated_at=timezone.now())
+
+
+def bump_history_version(user_id):
+    """Drop the closed budget periods every process has cached for ``user_id``."""
+    if user_id is not None:
+        _increment(user_id, 'history_version')
+
+
+def bump_alerts_version(user_id):
+    """Mark the pages of ``user_id`` as changed by budget alerts being seen, leaving their data version alone."""
+    if user_id is not None:
+        _increment(user_id, 'alerts_version')
+
+
+def bump_categories_version(user_id):
+    """Drop the category list every process has cached for ``user_id``."""
+    if user_id is not None:
+        _increment(user_id, 'categories_version')
+
+
+def bump_classifier_version(user_id):
+    """Tell every process that the category classifier of ``user_id`` it holds is out of date."""
+    if user_id is not None:
+        _increment(user_id, 'classifier_version')
+
+
+def _increment(user_id, field, **changes):
+    changes[field] = F(field) + 1
+    if DataVersion.objects.filter(user_id=user_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(user_id=user_id, **{field: 1})
+    except IntegrityError:
+        # A concurrent write created it first
+        DataVersion.objects.filter(user_id=user_id).update(**changes)
+
+
+def get_data_version(user):
+    """
+    Return the current DataVersion of ``user`` (a User or an id), unsaved
+    at version 0 before their first write.
+
+    Only reads, so replica_reads views and conditional GETs never count as
+    a write that pins the session to the primary.
+    """
+    version = DataVersion.objects.filter(user=user).first()
+    if version is None:
+        version = DataVersion(user_id=getattr(user, 'pk', user), version=0)
+    return version
+
+
+def request_data_version(request):
+    """Return the DataVersion of the request's user, read once per request."""
+    if not hasattr(request, '_data_version'):
+        request._data_version = get_data_version(request.user)
+    return request._data_version
+
+
+def _is_cacheable(request):
+    # Pending messages are shown once, so such a page must be rendered
+    messages = getattr(request, '_messages', None)
+    return request.user.is_authenticated and not (messages is not None and len(messages))
+
+
+def data_etag(request, *args, **kwargs):
+    if not _is_cacheable(request):
+        return None
+    version = request_data_version(request)
+    # Pages also depend on the date and embed a token derived from the CSRF
+    # cookie; get_token() creates the cookie now if the client has none yet
+    get_token(request)
+    key = (
+        f'{request.user.pk}:{version.version}:{version.alerts_version}:'
+        f'{timezone.localdate()}:{request.META["CSRF_COOKIE"]}'
+    )
+    return sha256(key.encode()).hexdigest()[:32]
+
+
+def data_last_modified(request, *args, **kwargs):
+    if not _is_cacheable(request):
+        return None
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    updated_at = request_data_version(request).updated_at
+    return max(updated_at, midnight) if updated_at is not None else midnight
+
+
+def conditional_on_data_version(view):
+    """
+    Answer GET requests with 304 Not Modified while the user's data version is unchanged.
+
+    The check costs one DataVersion lookup, so an unchanged page runs no
+    aggregates and renders no templates. Responses carry ETag and
+    Last-Modified and ask browsers to revalidate every time.
+
+    Goes inside replica_reads, so the version is read from the same
+    database as the page it tags.
+    """
+    conditional = condition(etag_func=data_etag, last_modified_func=data_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional(request, *args, **kwargs)
+        if response.has_header('ETag'):
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
@@ -3,27 +3,42 @@ from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.db import router
+from django.db.models import Sum, Count, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import datetime, timedelta
 from decimal import Decimal
 import csv
 import json
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from django.http import HttpResponse
-import google.generativeai as genai
-import os
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from django.urls import reverse
+from django.utils.html import escape
 from dotenv import load_dotenv
 
-from .models import Expense, BudgetCap, Category
-from .forms import ExpenseForm, BudgetCapForm, CategoryForm
+from .models import Expense, BudgetCap, Category, RecurringExpense, ReportJob
+from .forms import ExpenseForm, ExpenseImportForm, BudgetCapForm, CategoryForm, RecurringExpenseForm
+from .categories import user_categories
+from .currency import CENT, base_currency, converted_amount, format_money
+from .budgets import evaluate_budgets, period_history, split_alerts
+from .metrics import get_dashboard_metrics
+from .pagination import KEYSET_ORDERING, keyset_page
+from .filters import clean_filters, filter_expenses
+from .reports import report_etag, request_report
+from .importer import detect_format, import_expenses
+from .ai import AIBusyError, AIConfigurationError, generate_prediction, stream_prediction
+from .profiling import view_stats
+from .recurring import materialize_recurring
+from .routing import reading_from_replica, replica_reads
+from .search import SEARCH_ORDERING
+from .versioning import conditional_on_data_version, request_data_version
 
 load_dotenv()
 
+IMPORT_ERRORS_SHOWN = 100
+
 
 def register(request):
     if request.user.is_authenticated:
@@ -44,7 +59,9 @@ def register(request):
 
 @login_required
 def category_list(request):
-    categories = Category.objects.filter(user=request.user).order_by('name')
+    categories = Category.objects.filter(user=request.user).annotate(
+        expense_count=Count('expenses'),
+    ).order_by('name')
     context = {
         'categories': categories,
     }
@@ -102,59 +119,25 @@ def category_delete(request, pk):
 
 
 @login_required
+@replica_reads
+@conditional_on_data_version
 def dashboard(request):
-    expenses = Expense.objects.filter(user=request.user)
-    
-    total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-    
     now = timezone.now()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    month_expenses = expenses.filter(date__gte=month_start).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
+    metrics = get_dashboard_metrics(request.user, now.date(), request_data_version(request).version)
     
-    week_ago = now.date() - timedelta(days=7)
-    week_expenses = expenses.filter(date__gte=week_ago).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
+    recent_expenses = Expense.objects.filter(user=request.user).select_related('category')[:5]
     
-    days_in_month = now.day
-    avg_daily = (month_expenses / days_in_month) if days_in_month > 0 else Decimal('0')
-    
-    category_stats = expenses.values('category__name').annotate(total=Sum('amount')).order_by('-total')
-    category_data = {
-        'labels': [item['category__name'] or 'Uncategorized' for item in category_stats],
-        'values': [float(item['total']) for item in category_stats]
-    }
-    
-    last_6_months = []
-    monthly_values = []
-    for i in range(5, -1, -1):
-        month = now - timedelta(days=30 * i)
-        month_start_date = month.replace(day=1)
-        if i > 0:
-            next_month = (month_start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            month_total = expenses.filter(date__gte=month_start_date, date__lt=next_month).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-        else:
-            month_total = expenses.filter(date__gte=month_start_date).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-        last_6_months.append(month.strftime('%b %Y'))
-        monthly_values.append(float(month_total))
-    
-    monthly_data = {
-        'labels': last_6_months,
-        'values': monthly_values
-    }
-    
-    recent_expenses = expenses[:5]
-    
-    budgets = BudgetCap.objects.filter(user=request.user, is_active=True)
-    exceeded_budgets = [b for b in budgets if b.is_exceeded()]
-    warning_budgets = [b for b in budgets if not b.is_exceeded() and b.get_percentage_used() >= 80]
+    budgets = evaluate_budgets(request.user)
+    exceeded_budgets, warning_budgets = split_alerts(budgets)
     
     context = {
-        'total_expenses': total_expenses,
-        'month_expenses': month_expenses,
-        'week_expenses': week_expenses,
-        'avg_daily': round(avg_daily, 2),
+        'total_expenses': metrics['total_expenses'],
+        'month_expenses': metrics['month_expenses'],
+        'week_expenses': metrics['week_expenses'],
+        'avg_daily': metrics['avg_daily'],
         'current_month': now.strftime('%B %Y'),
-        'category_data': json.dumps(category_data),
-        'monthly_data': json.dumps(monthly_data),
+        'category_data': json.dumps(metrics['category_data']),
+        'monthly_data': json.dumps(metrics['monthly_data']),
         'recent_expenses': recent_expenses,
         'exceeded_budgets': exceeded_budgets,
         'warning_budgets': warning_budgets,
@@ -164,33 +147,76 @@ def dashboard(request):
     return render(request, 'expenses/dashboard.html', context)
 
 
+def list_ordering(params):
+    """Searches list the most relevant expenses first, everything else the newest first"""
+    return SEARCH_ORDERING if 'q' in clean_filters(params) else KEYSET_ORDERING
+
+
 @login_required
+@conditional_on_data_version
 def expense_list(request):
-    expenses = Expense.objects.filter(user=request.user)
-    
-    category = request.GET.get('category')
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-    
-    if category:
-        expenses = expenses.filter(category__id=category)
-    if from_date:
-        expenses = expenses.filter(date__gte=from_date)
-    if to_date:
-        expenses = expenses.filter(date__lte=to_date)
-    
-    total = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-    user_categories = Category.objects.filter(user=request.user).order_by('name')
+    expenses = filter_expenses(Expense.objects.filter(user=request.user), request.GET, request.user)
+    summary = expenses.aggregate(total=Sum(converted_amount()), count=Count('id'))
+    ordering = list_ordering(request.GET)
+    
+    try:
+        page, next_cursor = keyset_page(
+            expenses.select_related('category'),
+            cursor=request.GET.get('cursor'),
+            page_size=request.GET.get('page_size'),
+            ordering=ordering,
+        )
+    except ValueError:
+        page, next_cursor = keyset_page(
+            expenses.select_related('category'), page_size=request.GET.get('page_size'), ordering=ordering,
+        )
+    
+    next_params = request.GET.copy()
+    next_params['cursor'] = next_cursor or ''
     
     context = {
-        'expenses': expenses,
-        'categories': user_categories,
-        'total': total,
+        'expenses': page,
+        'categories': user_categories(request.user, request_data_version(request)),
+        'total': summary['total'] or Decimal('0'),
+        'expense_count': summary['count'],
+        'next_cursor': next_cursor,
+        'next_query': next_params.urlencode(),
     }
     
     return render(request, 'expenses/expense_list.html', context)
 
 
+@login_required
+@conditional_on_data_version
+def expense_list_page(request):
+    """JSON page of expenses after ``cursor``, for infinite scrolling"""
+    expenses = filter_expenses(Expense.objects.filter(user=request.user), request.GET, request.user)
+    ordering = list_ordering(request.GET)
+    columns = ['id', 'date', 'created_at', 'amount', 'currency', 'description', 'category__name']
+    if ordering == SEARCH_ORDERING:
+        columns.append('search_rank')
+    rows = expenses.values(*columns)
+    
+    try:
+        page, next_cursor = keyset_page(rows, request.GET.get('cursor'), request.GET.get('page_size'), ordering)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    results = [{
+        'id': row['id'],
+        'date': row['date'].isoformat(),
+        'category': row['category__name'],
+        'amount': str(row['amount']),
+        'currency': row['currency'],
+        'amount_display': format_money(row['amount'], row['currency']),
+        'description': row['description'],
+        'edit_url': reverse('expense_edit', args=[row['id']]),
+        'delete_url': reverse('expense_delete', args=[row['id']]),
+    } for row in page]
+    
+    return JsonResponse({'results': results, 'next_cursor': next_cursor})
+
+
 @login_required
 def expense_add(request):
     if request.method == 'POST':
@@ -200,16 +226,6 @@ def expense_add(request):
             expense.user = request.user
             expense.save()
             
-            exceeded_budgets = check_budget_alerts(request.user)
-            if exceeded_budgets:
-                budget_names = ', '.join([b.name for b in exceeded_budgets])
-                messages.warning(request, f'Budget alert! You have exceeded: {budget_names}')
-            
-            warning_budgets = check_budget_warnings(request.user)
-            if warning_budgets:
-                for budget in warning_budgets:
-                    messages.warning(request, f'You have reached {budget.get_percentage_used()}% of your {budget.name} budget!')
-            
             messages.success(request, 'Expense added successfully!')
             return redirect('expense_list')
     else:
@@ -223,6 +239,32 @@ def expense_add(request):
     return render(request, 'expenses/expense_form.html', context)
 
 
+@login_required
+def expense_import(request):
+    result = None
+    if request.method == 'POST':
+        form = ExpenseImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            file_format = detect_format(upload.name, form.cleaned_data['format'])
+            result = import_expenses(request.user, upload.file, file_format)
+            
+            if result.created:
+                messages.success(request, f'Imported {result.created} expenses.')
+            if not result.errors:
+                return redirect('expense_list')
+    else:
+        form = ExpenseImportForm()
+    
+    context = {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:IMPORT_ERRORS_SHOWN] if result else [],
+    }
+    
+    return render(request, 'expenses/expense_import.html', context)
+
+
 @login_required
 def expense_edit(request, pk):
     expense = get_object_or_404(Expense, pk=pk, user=request.user)
@@ -232,16 +274,6 @@ def expense_edit(request, pk):
         if form.is_valid():
             form.save()
             
-            exceeded_budgets = check_budget_alerts(request.user)
-            if exceeded_budgets:
-                budget_names = ', '.join([b.name for b in exceeded_budgets])
-                messages.warning(request, f'Budget alert! You have exceeded: {budget_names}')
-            
-            warning_budgets = check_budget_warnings(request.user)
-            if warning_budgets:
-                for budget in warning_budgets:
-                    messages.warning(request, f'You have reached {budget.get_percentage_used()}% of your {budget.name} budget!')
-            
             messages.success(request, 'Expense updated successfully!')
             return redirect('expense_list')
     else:
@@ -263,73 +295,76 @@ def expense_delete(request, pk):
     return redirect('expense_list')
 
 
+class Echo:
+    """File-like object whose write() hands the row back to the CSV writer's caller"""
+    def write(self, value):
+        return value
+
+
 @login_required
+@replica_reads
+@conditional_on_data_version
 def export_csv(request):
-    response = HttpResponse(content_type='text/csv')
+    expenses = filter_expenses(Expense.objects.filter(user=request.user), request.GET, request.user)
+    rows = expenses.order_by('-date', '-created_at', '-id').values_list(
+        'date',
+        Coalesce('category__name', Value('Uncategorized')),
+        'amount',
+        'currency',
+        converted_amount(),
+        'description',
+    )
+    # The rows are read after the view returns, once replica_reads is over
+    rows = rows.using(router.db_for_read(Expense))
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    
+    def stream():
+        writer = csv.writer(Echo())
+        yield writer.writerow(['Date', 'Category', 'Amount', 'Currency', f'Amount ({base_currency()})', 'Description'])
+        for day, category_name, amount, currency, converted, description in rows.iterator(chunk_size=chunk_size):
+            converted = '' if converted is None else converted.quantize(CENT)
+            yield writer.writerow([day, category_name, amount, currency, converted, description])
+    
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="expenses.csv"'
     
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Category', 'Amount', 'Description'])
-    
-    expenses = Expense.objects.filter(user=request.user)
-    for expense in expenses:
-        category_name = expense.category.name if expense.category else 'Uncategorized'
-        writer.writerow([expense.date, category_name, expense.amount, expense.description])
-    
     return response
 
 
 @login_required
 def export_pdf(request):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    styles = getSampleStyleSheet()
-    title = Paragraph(f"<b>ExpenseMate - Expense Report for {request.user.username}</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-    
-    expenses = Expense.objects.filter(user=request.user)
-    
-    data = [['Date', 'Category', 'Amount', 'Description']]
-    total = Decimal('0')
-    
-    for expense in expenses:
-        category_name = expense.category.name if expense.category else 'Uncategorized'
-        data.append([
-            expense.date.strftime('%Y-%m-%d'),
-            category_name,
-            f'Rs.{expense.amount}',
-            expense.description[:50]
-        ])
-        total += expense.amount
-    
-    data.append(['', '', f'Rs.{total}', 'TOTAL'])
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    response = HttpResponse(buffer.read(), content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="expenses.pdf"'
+    job = request_report(request.user, request.GET)
+    if job.is_ready:
+        return redirect('report_download', pk=job.pk)
     
-    return response
+    context = {
+        'job': job,
+    }
+    return render(request, 'expenses/report_status.html', context, status=202)
+
+
+@login_required
+def report_status(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, user=request.user)
+    return JsonResponse({
+        'status': job.status,
+        'download_url': reverse('report_download', args=[job.pk]) if job.is_ready else None,
+        'error': job.error or None,
+    })
+
+
+@login_required
+@condition(etag_func=report_etag)
+def report_download(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, user=request.user)
+    if not job.is_ready:
+        return redirect('export_pdf')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename='expenses.pdf',
+                        content_type='application/pdf')
 
 
 @login_required
+@replica_reads
 def ai_predictions(request):
     prediction = None
     error = None
@@ -339,71 +374,10 @@ def ai_predictions(request):
         custom_question = request.POST.get('custom_question', '')
         
         try:
-            api_key = os.environ.get('GEMINI_API_KEY')
-            sys_prompt = "No Markdown syntax allowed."
-            
-            if not api_key:
-                error = "Please set your GEMINI_API_KEY environment variable to use AI predictions."
-            else:
-                genai.configure(api_key=api_key)
-                
-                expenses = Expense.objects.filter(user=request.user)
-                
-                expense_summary = []
-                for expense in expenses[:50]:
-                    expense_summary.append(f"{expense.date}: {expense.category} - ₹{expense.amount}")
-                
-                category_stats = expenses.values('category').annotate(total=Sum('amount')).order_by('-total')
-                category_text = ', '.join([f"{item['category']}: ₹{item['total']}" for item in category_stats])
-                
-                total = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-                
-                if prediction_type == 'next_month':
-                    prompt = f"""Based on these expense records, predict next month's spending:
-                    
-Total expenses so far: ₹{total}
-Category breakdown: {category_text}
-
-Recent expenses:
-{chr(10).join(expense_summary)}
-
-Provide a brief prediction of next month's spending with specific amounts."""
-                
-                elif prediction_type == 'category_insights':
-                    prompt = f"""Analyze these expenses and provide category-wise insights:
-                    
-Total expenses: ₹{total}
-Category breakdown: {category_text}
-
-Recent expenses:
-{chr(10).join(expense_summary)}
-
-Which categories need attention? Provide specific recommendations."""
-                
-                elif prediction_type == 'budget_advice':
-                    prompt = f"""Based on these expenses, provide budget recommendations:
-                    
-Total expenses: ₹{total}
-Category breakdown: {category_text}
-
-Recent expenses:
-{chr(10).join(expense_summary)}
-
-Suggest a realistic monthly budget and saving strategies."""
-                
-                else:
-                    prompt = f"""Based on these expense records, answer this question: {custom_question}
-                    
-Total expenses: ₹{total}
-Category breakdown: {category_text}
-
-Recent expenses:
-{chr(10).join(expense_summary)}"""
-                
-                model = genai.GenerativeModel('gemini-2.5-flash')
-                response = model.generate_content(prompt + sys_prompt)
-                prediction = response.text.replace('\n', '<br>')
-        
+            answer = generate_prediction(request.user, prediction_type, custom_question)
+            prediction = escape(answer).replace('\n', '<br>')
+        except AIConfigurationError as e:
+            error = str(e)
         except Exception as e:
             error = f"Error generating predictions: {str(e)}"
     
@@ -413,10 +387,45 @@ Recent expenses:
     })
 
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@login_required
+@replica_reads
+async def ai_predictions_stream(request):
+    """Stream the AI answer to the browser as server-sent events."""
+    user = await request.auser()
+    prediction_type = request.GET.get('prediction_type')
+    custom_question = request.GET.get('custom_question', '')
+
+    async def events():
+        # Runs after the view has returned, so replica_reads no longer applies
+        with reading_from_replica(request):
+            try:
+                async for token in stream_prediction(user, prediction_type, custom_question):
+                    yield sse_event('token', token)
+            except (AIConfigurationError, AIBusyError) as e:
+                yield sse_event('failed', str(e))
+            except TimeoutError:
+                yield sse_event('failed', "The AI service took too long to respond. Please try again.")
+            except Exception as e:
+                yield sse_event('failed', f"Error generating predictions: {str(e)}")
+            else:
+                yield sse_event('done', '')
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
+@replica_reads
+@conditional_on_data_version
 def budget_list(request):
-    budgets = BudgetCap.objects.filter(user=request.user)
-    exceeded_budgets = [b for b in budgets if b.is_exceeded()]
+    budgets = evaluate_budgets(request.user, BudgetCap.objects.filter(user=request.user))
+    exceeded_budgets, _ = split_alerts(budgets)
     
     context = {
         'budgets': budgets,
@@ -426,6 +435,24 @@ def budget_list(request):
     return render(request, 'expenses/budget_list.html', context)
 
 
+@login_required
+@replica_reads
+def budget_history(request, pk):
+    budget = get_object_or_404(BudgetCap.objects.select_related('category'), pk=pk, user=request.user)
+    history = period_history(budget)
+    total = sum((status.spent for status in history), Decimal('0'))
+    
+    context = {
+        'budget': budget,
+        'history': history,
+        'exceeded_count': sum(status.exceeded for status in history),
+        'total_spent': total,
+        'average_spent': round(total / len(history), 2) if history else Decimal('0'),
+    }
+    
+    return render(request, 'expenses/budget_history.html', context)
+
+
 @login_required
 def budget_add(request):
     if request.method == 'POST':
@@ -478,12 +505,66 @@ def budget_delete(request, pk):
     return redirect('budget_list')
 
 
-def check_budget_alerts(user):
-    budgets = BudgetCap.objects.filter(user=user, is_active=True)
-    return [b for b in budgets if b.is_exceeded()]
+@login_required
+def recurring_list(request):
+    rules = RecurringExpense.objects.filter(user=request.user).select_related('category')
+    return render(request, 'expenses/recurring_list.html', {'rules': rules})
+
+
+def _save_recurring(request, form):
+    rule = form.save(commit=False)
+    rule.user = request.user
+    rule.save()
+    # Occurrences already due show up right away instead of at the next scheduler run
+    created, _ = materialize_recurring(rules=RecurringExpense.objects.filter(pk=rule.pk))
+    if created:
+        messages.info(request, f'Added {created} expense{"s" if created != 1 else ""} that were already due.')
+    return rule
+
+
+@login_required
+def recurring_add(request):
+    if request.method == 'POST':
+        form = RecurringExpenseForm(request.POST, user=request.user)
+        if form.is_valid():
+            _save_recurring(request, form)
+            messages.success(request, 'Recurring expense created successfully!')
+            return redirect('recurring_list')
+    else:
+        form = RecurringExpenseForm(user=request.user)
+    
+    return render(request, 'expenses/recurring_form.html', {'form': form})
 
 
-def check_budget_warnings(user):
-    """Check for budgets that have reached 80% threshold but not exceeded"""
-    budgets = BudgetCap.objects.filter(user=user, is_active=True)
-    return [b for b in budgets if not b.is_exceeded() and b.get_percentage_used() >= 80]
+@login_required
+def recurring_edit(request, pk):
+    rule = get_object_or_404(RecurringExpense, pk=pk, user=request.user)
+    
+    if request.method == 'POST':
+        form = RecurringExpenseForm(request.POST, instance=rule, user=request.user)
+        if form.is_valid():
+            _save_recurring(request, form)
+            messages.success(request, 'Recurring expense updated successfully!')
+            return redirect('recurring_list')
+    else:
+        form = RecurringExpenseForm(instance=rule, user=request.user)
+    
+    return render(request, 'expenses/recurring_form.html', {'form': form, 'rule': rule})
+
+
+@login_required
+def recurring_delete(request, pk):
+    rule = get_object_or_404(RecurringExpense, pk=pk, user=request.user)
+    # The expenses it already made are kept
+    rule.delete()
+    messages.success(request, 'Recurring expense deleted successfully!')
+    return redirect('recurring_list')
+
+
+@staff_member_required
+def profiling_metrics(request):
+    return JsonResponse({
+        'enabled': settings.PROFILING_ENABLED,
+        'views': view_stats.snapshot(),
+        'budgets': settings.VIEW_QUERY_BUDGETS,
+    })
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .alerts import record_transitions, refresh_budget_alerts
+from .budgets import evaluate_budgets
+from .classifier import record_examples
+from .models import Expense
+from .rollups import apply_deltas, expense_deltas, rebuild_rollups
+from .versioning import bump_data_version
+
+
+EXPENSE_FIELDS = ('category', 'amount', 'currency', 'date', 'description')
+
+
+def save_expenses(user_id, new=(), changed=(), previous=(), fields=EXPENSE_FIELDS):
+    """
+    Insert the ``new`` expenses of ``user_id`` and write ``fields`` of the
+    ``changed`` ones, whose stored state before the change is ``previous``.
+
+    Like the importer, this bypasses Expense.save(): rollups, the dashboard
+    cache, the data version, budget alerts and the category classifier are
+    each updated once for the whole batch.
+    """
+    new, changed, previous = list(new), list(changed), list(previous)
+    if not new and not changed:
+        return
+    now = timezone.now()
+    for expense in changed:
+        expense.updated_at = now
+
+    # Callers inside a transaction (the API batch) need no savepoint of their own
+    with transaction.atomic(savepoint=False):
+        Expense.objects.bulk_create(new)
+        Expense.objects.bulk_update(changed, [*fields, 'updated_at'])
+        deltas = expense_deltas(previous, sign=-1)
+        apply_deltas(expense_deltas(new + changed, deltas=deltas))
+        record_examples(removed=previous, added=new + changed)
+        bump_data_version(user_id)
+        refresh_budget_alerts(user_id, previous + new + changed)
+
+
+def reconvert_expenses(changed):
+    """
+    Rebuild the rollups of every user with expenses whose conversion to the
+    base currency a rate load changed, given the ``{currency: since}`` of
+    currency.load_rates(), and refresh their budget alerts. Returns the ids
+    of those users.
+    """
+    users = set()
+    for currency, since in changed.items():
+        expenses = Expense.objects.filter(currency=currency, user__isnull=False)
+        if since is not None:
+            expenses = expenses.filter(date__gte=since)
+        users.update(expenses.order_by().values_list('user_id', flat=True).distinct())
+    for user_id in sorted(users):
+        rebuild_rollups(user_id)
+        record_transitions(evaluate_budgets(user_id))
+    return users